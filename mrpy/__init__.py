@@ -1,7 +1,7 @@
 __version__ = "1.1.0"
 
 from mrpy.base.stats import TGGD
-from mrpy.base.core import MRP, dndm
+from mrpy.base.core import MRP, MassGrid, dndm
 from mrpy.extra.physical_dependence import mrp_b13
 
 
@@ -1,5 +1,10 @@
 import numpy as np
 
+try:
+    string_types = basestring
+except NameError:  # Python 3
+    string_types = str
+
 def copydoc(fromfunc, sep="\n"):
     """
     Decorator: Copy the docstring of `fromfunc`
@@ -60,4 +65,12 @@ def extra_squeeze(a):
     if np.prod(b.shape)==1:
         return b[0]
     else:
-        return b
\ No newline at end of file
+        return b
+
+def load_array(a):
+    """
+    If `a` is the path to a ``.npy`` file, return it as a read-only memory-map, otherwise return it unchanged.
+    """
+    if isinstance(a, string_types):
+        return np.load(a, mmap_mode="r")
+    return a
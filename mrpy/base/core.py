@@ -8,11 +8,22 @@ Note that in this package, the `MRP` will refer to the truncated generalised gam
 This does not in principle restrict the usage of the MRP for other applications, such as luminosity
 functions or other data.
 """
+import functools
+import math
 import numpy as np
+from cached_property import cached_property as _cached
+import scipy.special as _sc
 import mrpy.base.special as sp
+from mrpy._utils import string_types
 from . import stats
 
 
+def _squeeze(x):
+    # Return 0-d arrays as floats, to preserve the type of scalar input.
+    x = np.asarray(x)
+    return float(x) if x.ndim == 0 else x
+
+
 def entire_integral(logHs, alpha, beta):
     r"""
     The entire integral of the un-normalised mass-weighted *non-truncated* MRP:
@@ -22,7 +33,8 @@ def entire_integral(logHs, alpha, beta):
     where *s* defines a weighting of the integral, in which the immediate application is that
     ``s=1`` gives the total mass density.
 
-    .. note:: The sum of `alpha` and `s` must be greater than -1.
+    .. note:: The sum of `alpha` and `s` must be greater than -1. Where it is not, the
+              integral diverges, and ``inf`` is returned.
 
     Parameters
     ----------
@@ -34,8 +46,12 @@ def entire_integral(logHs, alpha, beta):
 
     beta : array_like
         Exponential cutoff parameter
+
+    All parameters may be arrays, which are broadcast against each other.
     """
-    return 10 ** (2 * logHs) * sp.gamma((alpha + 2) / beta)
+    logHs, alpha, beta = np.broadcast_arrays(logHs, alpha, beta)
+    z = np.where(alpha > -2, (alpha + 2) / beta, 1.0)
+    return _squeeze(np.where(alpha > -2, 10 ** (2 * logHs) * _sc.gamma(z), np.inf))
 
 
 def log_mass_mode(logHs, alpha, beta):
@@ -45,12 +61,14 @@ def log_mass_mode(logHs, alpha, beta):
     Parameters
     ----------
     logHs, alpha, beta: array_like
-        Shape parameters of the MRP distribution.
+        Shape parameters of the MRP distribution. These may be arrays, which are
+        broadcast against each other.
 
     Returns
     -------
     lmm : array_like
-        The log-space mass mode of the MRP.
+        The log-space mass mode of the MRP. This is ``nan`` where ``alpha = -2``, and
+        zero where ``alpha < -2``.
 
     Examples
     --------
@@ -70,12 +88,10 @@ def log_mass_mode(logHs, alpha, beta):
     >>> 10**s.derivative().roots()[0]
     1.67016715e+13
     """
-    if alpha > -2:
-        return 10 ** logHs * ((alpha + 2) / beta) ** (1. / beta)
-    elif alpha == -2:
-        return np.nan
-    elif alpha < -2:
-        return 0
+    logHs, alpha, beta = np.broadcast_arrays(logHs, alpha, beta)
+    z = np.where(alpha > -2, (alpha + 2) / beta, 1.0)
+    return _squeeze(np.where(alpha > -2, 10 ** logHs * z ** (1. / beta),
+                             np.where(alpha == -2, np.nan, 0.0)))
 
 
 def A_rhom(logHs, alpha, beta, rhom=0.3 * 2.7755e11):
@@ -100,6 +116,8 @@ def A_rhom(logHs, alpha, beta, rhom=0.3 * 2.7755e11):
 
     rhom : float, optional
         The mass density of the Universe.
+
+    All parameters may be arrays, which are broadcast against each other.
     """
     return rhom / entire_integral(logHs, alpha, beta)
 
@@ -112,31 +130,84 @@ def A_rhom(logHs, alpha, beta, rhom=0.3 * 2.7755e11):
 #     return logHs + np.log10((alpha+2)/beta)/beta
 
 
+class MassGrid(object):
+    """
+    A fixed grid of masses, on which the MRP is to be evaluated many times.
+
+    All quantities which depend only on the masses are computed once, on creation. The
+    grid may be passed in place of the masses to :func:`dndm`, :func:`ngtm`, :func:`rho_gtm`
+    and :func:`dndm_batch`, or in place of `logm` to :class:`MRP`, so that each evaluation
+    only computes the parameter-dependent pieces.
+
+    Parameters
+    ----------
+    logm : array_like
+        Vector of log10 masses.
+
+    log_mmin : float, optional
+        Log-10 truncation mass. By default is set to the minimum mass in ``logm``.
+
+    Examples
+    --------
+    >>> grid = MassGrid(np.linspace(10, 15, 500))
+    >>> np.allclose(dndm(grid, 14.0, -1.9, 0.8), dndm(grid.m, 14.0, -1.9, 0.8))
+    True
+    """
+
+    def __init__(self, logm, log_mmin=None):
+        self.logm = np.asarray(logm, dtype=float)
+        self.log_mmin = self.logm.min() if log_mmin is None else log_mmin
+
+        self.lnm = np.log(10) * self.logm
+        self.m = np.exp(self.lnm)
+        self.mmin = 10 ** self.log_mmin
+
+        # Widths of the bins (in log10 m) centred on each mass.
+        self.dlogm = np.gradient(self.logm) if len(self.logm) > 1 else np.ones_like(self.logm)
+        self.dm = np.log(10) * self.m * self.dlogm
+
+    def __len__(self):
+        return len(self.logm)
+
+    def lny(self, logHs):
+        """
+        Natural log of the masses scaled by the scale mass, ``ln(m/Hs)``.
+        """
+        return self.lnm - np.log(10) * logHs
+
+
+def _masses(m):
+    # Real-space masses, whether given as an array or a MassGrid
+    return m.m if isinstance(m, MassGrid) else m
+
+
 def _getnorm(norm, logHs, alpha, beta, mmin, log=False, **Arhom_kw):
-    if norm == "pdf":
-        x = stats.TGGD(scale=10 ** logHs, a=alpha, b=beta, xmin=mmin)._pdf_norm(log)
-        if log:
-            return -x
-        else:
-            return 1. / x
+    # Normalisation of the MRP. All parameters (and a numerical norm) may be broadcastable arrays.
+    if isinstance(norm, string_types):
+        if norm == "pdf":
+            x = 10 ** logHs * sp.gammainc_fast((alpha + 1) / beta, (mmin / 10 ** logHs) ** beta)
+            if log:
+                return -np.log(x)
+            else:
+                return 1. / x
+        elif norm == "rhom":
+            x = A_rhom(logHs, alpha, beta, **Arhom_kw)
+            if log:
+                return np.log(x)
+            else:
+                return x
     elif np.all(np.isreal(norm)):
         if log:
             return np.log(norm)
         else:
             return norm
-    elif norm == "rhom":
-        x = A_rhom(logHs, alpha, beta, **Arhom_kw)
-        if log:
-            return np.log(x)
-        else:
-            return x
-    else:
-        ValueError("norm should be a float, or the strings 'pdf' or 'rhom'")
+
+    raise ValueError("norm should be a float, or the strings 'pdf' or 'rhom'")
 
 
 def _head(m, logHs, alpha, beta, mmin=None, norm="pdf", log=False, **Arhoc_kw):
     if mmin is None:
-        mmin = m.min()
+        mmin = m.mmin if isinstance(m, MassGrid) else m.min()
 
     tggd = stats.TGGD(a=alpha, b=beta, xmin=mmin, scale=10 ** logHs)
 
@@ -151,10 +222,10 @@ def _tail(shape, A, log):
         return shape * A
 
 
-_pardoc = """
+_pardoc = r"""
     Parameters
     ----------
-    m : array_like
+    m : array_like or :class:`MassGrid`
         Vector of masses at which to evaluate the MRP
 
     logHs : float
@@ -191,43 +262,381 @@ def dndm(m, logHs, alpha, beta, mmin=None, norm="pdf", log=False, **Arhoc_kw):
     %s
     """
     t, A = _head(m, logHs, alpha, beta, mmin, norm, log, **Arhoc_kw)
-    shape = t._pdf_shape(m, log)
+    if isinstance(m, MassGrid):
+        lny = m.lny(logHs)
+        if log:
+            shape = np.log(beta) + alpha * lny - np.exp(beta * lny)
+        else:
+            shape = beta * np.exp(alpha * lny - np.exp(beta * lny))
+    else:
+        shape = t._pdf_shape(m, log)
     return _tail(shape, A, log)
 
 
 dndm.__doc__ %= _pardoc
 
 
-def ngtm(m, logHs, alpha, beta, mmin=None, norm="pdf", log=False, **Arhom_kw):
+_sorted_grid_doc = """
+    sorted_grid : logical, optional
+        Whether to use a fast algorithm suitable for dense grids of masses, which must be
+        sorted in ascending order. The value at the highest mass (and at regular anchor masses
+        below it) is computed exactly, and the rest are accumulated by Gauss-Legendre
+        quadrature of the MRP between neighbouring masses. See :func:`_integral_sorted`.
+    """
+
+
+def _integral_sorted(m, logHs, alpha, beta, s=0, order=None, anchor=1000):
+    r"""
+    The integral of the un-normalised mass-weighted MRP above each mass of a sorted grid:
+
+    .. math:: \int_m^\infty m'^s f(m') dm' = \mathcal{H}_\star^{s+1} \Gamma\left(\frac{\alpha+1+s}{\beta}, (m/\mathcal{H}_\star)^\beta\right).
+
+    The incomplete gamma function is evaluated only at every `anchor` th mass, counting down
+    from the highest. Integrals over the intervals between neighbouring masses are computed
+    with `order`-point Gauss-Legendre quadrature in log-space, and accumulated downwards from
+    the nearest anchor above, so that errors cannot build up across the grid.
+
+    Parameters
+    ----------
+    m : array_like
+        Masses, in ascending order.
+
+    logHs, alpha, beta : float
+        Shape parameters of the MRP.
+
+    s : float, optional
+        Mass-weighting of the integral (``s=1`` gives the mass density).
+
+    order : int, optional
+        Number of quadrature points per interval. By default, the smallest order (up to 8)
+        for which the quadrature error is estimated to be below machine precision on the
+        widest interval. If even 8 points are not estimated to suffice (ie. on coarse grids),
+        the incomplete gamma function is instead evaluated at every mass.
+
+    anchor : int, optional
+        Spacing (in grid points) of the exactly-computed values.
+    """
+    m = np.asarray(m, dtype=float)
+    if np.any(np.diff(m) <= 0):
+        raise ValueError("masses must be strictly increasing for sorted_grid")
+
+    n = len(m)
+    lnHs = np.log(10) * logHs
+    lny = np.log(m) - lnHs
+
+    def _exact(ind):
+        return np.exp((s + 1) * lnHs) * sp.gammainc_fast((alpha + 1 + s) / beta, np.exp(beta * lny[ind]))
+
+    # Integrals over each interval between neighbours, in ln(m), from the top down.
+    if order is None:
+        # The integrand varies on a (log) scale of roughly 1/k.
+        kh = np.max((np.abs(alpha + 1 + s) + beta * np.exp(beta * lny[1:])) * np.diff(lny))
+        order = 1
+        while order < 8 and kh ** (2 * order) / math.factorial(2 * order) > 1e-16:
+            order += 1
+        if kh ** (2 * order) / math.factorial(2 * order) > 1e-16:
+            # The grid is too coarse for the quadrature to be accurate: compute every value exactly.
+            return _exact(slice(None))
+
+    # Exact values at anchors
+    anchors = np.arange(n - 1, -1, -anchor)
+    exact = _exact(anchors)
+
+    nodes, weights = np.polynomial.legendre.leggauss(order)
+    half = np.diff(lny)[::-1, np.newaxis] / 2
+    u = (lny[1:] + lny[:-1])[::-1, np.newaxis] / 2 + half * nodes
+    intervals = np.exp((s + 1) * lnHs) * beta * np.dot(np.exp((alpha + 1 + s) * u - np.exp(beta * u)) * half,
+                                                       weights)
+
+    # Accumulate within blocks that each start at an anchor.
+    nblocks = len(anchors)
+    padded = np.zeros(nblocks * anchor)
+    padded[1:n] = intervals
+    partial = np.cumsum(padded.reshape((nblocks, anchor)), axis=1).ravel()
+
+    # padded[k*anchor] belongs to the previous block, so must not be counted.
+    partial = partial.reshape((nblocks, anchor)) - padded.reshape((nblocks, anchor))[:, :1]
+    out = np.repeat(exact, anchor) + partial.ravel()
+    return out[:n][::-1]
+
+
+def ngtm(m, logHs, alpha, beta, mmin=None, norm="pdf", log=False, sorted_grid=False, **Arhom_kw):
     """
     The integral of the MRP, in reverse (i.e. CDF=1 at mmin).
 
     %s
     """
     t, A = _head(m, logHs, alpha, beta, mmin, norm, log, **Arhom_kw)
-    t = stats.TGGD(a=alpha, b=beta, xmin=m, scale=10 ** logHs)
-    shape = t._pdf_norm(log)
+    m = _masses(m)
+    if sorted_grid:
+        shape = _integral_sorted(m, logHs, alpha, beta, 0)
+        if log:
+            shape = np.log(shape)
+    else:
+        shape = 10 ** logHs * sp.gammainc_fast((alpha + 1) / beta, (m / 10 ** logHs) ** beta)
+        if log:
+            shape = np.log(shape)
+
+    if isinstance(norm, string_types) and norm == "pdf" and not log:
+        # Divide by the total integral directly, so that the result is exactly 1 at mmin.
+        return shape / (10 ** logHs * sp.gammainc_fast(t._z, t._xmintb))
 
     return _tail(shape, A, log)
 
 
-ngtm.__doc__ %= _pardoc
+ngtm.__doc__ %= _pardoc + _sorted_grid_doc
 
 
-def rho_gtm(m, logHs, alpha, beta, mmin=None, norm="pdf", log=False, **Arhom_kw):
+def rho_gtm(m, logHs, alpha, beta, mmin=None, norm="pdf", log=False, sorted_grid=False, **Arhom_kw):
     """
     The mass-weighted integral of the MRP, in reverse (ie. from high to low mass)
 
     %s
     """
     _, A = _head(m, logHs, alpha, beta, mmin, norm, log, **Arhom_kw)
-    shape = 10 ** (2 * logHs) * sp.gammainc((alpha + 2) / beta, (m / 10 ** logHs) ** beta)
+    m = _masses(m)
+    if sorted_grid:
+        shape = _integral_sorted(m, logHs, alpha, beta, 1)
+    else:
+        shape = 10 ** (2 * logHs) * sp.gammainc_fast((alpha + 2) / beta, (m / 10 ** logHs) ** beta)
     if log:
         shape = np.log(shape)
     return _tail(shape, A, log)
 
 
-rho_gtm.__doc__ %= _pardoc
+rho_gtm.__doc__ %= _pardoc + _sorted_grid_doc
+
+
+# Largest integer 1/beta for which profile() uses the incomplete gamma recurrence.
+_MAX_RECURRENCE = 10
+
+
+def _gammainc_shift(g, z, x, t, k):
+    r"""
+    Upper incomplete gamma function :math:`\Gamma(z+k, x)` for positive integer `k`, from
+    ``g`` :math:`=\Gamma(z,x)`, using the upward recurrence
+
+    .. math:: \Gamma(s+1,x) = s\Gamma(s,x) + x^s e^{-x},
+
+    where ``t`` :math:`= x^z e^{-x}`. Where the recurrence loses significant precision through
+    cancellation (negative `s` and very small `x`), the result is re-evaluated directly.
+    """
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        # Running bound on the amplification of the relative error of g
+        amp = np.ones(np.broadcast(g, z, x).shape)
+        for j in range(k):
+            sg = (z + j) * g
+            g = sg + t
+            amp = (np.abs(sg) * (amp + 1) + t) / np.abs(g)
+            t = t * x
+        bad = ~np.isfinite(g) | ~(amp < 100)
+
+    if np.any(bad):
+        g = np.array(np.broadcast_to(g, bad.shape), dtype=float)
+        zb = np.broadcast_to(z + k, bad.shape)
+        xb = np.broadcast_to(x, bad.shape)
+        g[bad] = sp.gammainc_fast(zb[bad], xb[bad])
+    return g
+
+
+_profile_quantities = ("dndm", "ngtm", "rho_gtm")
+
+
+def profile(m, logHs, alpha, beta, quantities=_profile_quantities, mmin=None, norm="pdf", log=False, **Arhom_kw):
+    r"""
+    Several vector quantities of the MRP at once, sharing their intermediate computations.
+
+    The results are identical to those of :func:`dndm`, :func:`ngtm` and :func:`rho_gtm`, but
+    :math:`y = m/H_s`, :math:`x=y^\beta` and :math:`e^{-x}` are computed just once. Furthermore,
+    when :math:`1/\beta` is a small positive integer, the incomplete gamma function required for
+    :func:`rho_gtm` is obtained from that of :func:`ngtm` by recurrence, so that all three
+    quantities cost little more than one.
+
+    %s
+    quantities : sequence of str, optional
+        The quantities to compute, any of ``"dndm"``, ``"ngtm"`` and ``"rho_gtm"``.
+
+    Returns
+    -------
+    dict :
+        The requested quantities, keyed by name.
+    """
+    unknown = set(quantities) - set(_profile_quantities)
+    if unknown:
+        raise ValueError("quantities must be in %s, got %s" % (_profile_quantities, sorted(unknown)))
+
+    t, A = _head(m, logHs, alpha, beta, mmin, norm, log, **Arhom_kw)
+    if isinstance(m, MassGrid):
+        lny = m.lny(logHs)
+    else:
+        lny = np.log(m) - logHs * np.log(10)
+
+    Hs = 10 ** logHs
+    x = np.exp(beta * lny)
+    z = (alpha + 1) / beta
+
+    out = {}
+    # exp(alpha*lny - x), which gives both the MRP and the recurrence term x^z e^{-x}
+    e = np.exp(alpha * lny - x) if (not log or "rho_gtm" in quantities) else None
+
+    if "dndm" in quantities:
+        if log:
+            shape = np.log(beta) + alpha * lny - x
+        else:
+            shape = beta * e
+        out["dndm"] = _tail(shape, A, log)
+
+    if "ngtm" in quantities or "rho_gtm" in quantities:
+        g = sp.gammainc_fast(z, x)
+
+    if "ngtm" in quantities:
+        shape = Hs * g
+        if isinstance(norm, string_types) and norm == "pdf" and not log:
+            # The total integral, with x at mmin computed as for the masses, so that the result is exactly 1 there.
+            out["ngtm"] = shape / (Hs * sp.gammainc_fast(z, np.exp(beta * (np.log(t.xmin) - logHs * np.log(10)))))
+        else:
+            out["ngtm"] = _tail(np.log(shape) if log else shape, A, log)
+
+    if "rho_gtm" in quantities:
+        k = 1. / np.asarray(beta, dtype=float)
+        kint = int(np.round(k.flat[0]))
+        if 1 <= kint <= _MAX_RECURRENCE and np.all(np.abs(k - kint) < 1e-10):
+            g = _gammainc_shift(g, z, x, e * np.exp(lny), kint)
+        else:
+            g = sp.gammainc_fast(z + k, x)
+        shape = Hs ** 2 * g
+        out["rho_gtm"] = _tail(np.log(shape) if log else shape, A, log)
+
+    return out
+
+
+profile.__doc__ %= _pardoc
+
+
+def dndm_batch(m, samples, quantiles=(0.16, 0.5, 0.84), mmin=None, norm="pdf", log=False,
+               chunksize=1000, nbins=2000, **Arhom_kw):
+    r"""
+    Quantiles of the MRP at each mass over a set of parameter samples, eg. an MCMC chain.
+
+    The MRP is evaluated for chunks of `chunksize` samples at a time, with normalisations
+    vectorised over samples. If all samples fit in a single chunk, the quantiles are exact.
+    Otherwise, after a first pass to find the range of the MRP at each mass, each chunk is
+    reduced to a per-mass histogram of ``ln(dndm)``, from which the quantiles are interpolated.
+    The full (samples x masses) matrix is thus never held in memory.
+
+    Parameters
+    ----------
+    m : array_like or :class:`MassGrid`
+        Vector of masses at which to evaluate the MRP.
+
+    samples : array_like
+        Array of shape ``(N, 3)`` or ``(N, 4)``, whose columns are `logHs`, `alpha`, `beta`
+        and optionally `lnA` (for instance, ``SimFit.mcmc_res.flatchain``). If `lnA` is
+        given, it overrides `norm`.
+
+    quantiles : array_like, optional
+        Quantiles to compute, in the range [0,1].
+
+    mmin : float, optional
+        The lower-truncation mass. Default is the minimum mass in ``m``.
+
+    norm : string or float, optional
+        Normalisation of the MRP, as in :func:`dndm`. Only used if `samples` has three columns.
+
+    log : logical, optional
+        Whether to return quantiles of the natural log of the MRP.
+
+    chunksize : int, optional
+        Number of samples evaluated at once. Peak memory is roughly ``chunksize * len(m)``
+        floats.
+
+    nbins : int, optional
+        Number of histogram bins per mass used when the samples span more than one chunk.
+        Quantiles of ``ln(dndm)`` are then accurate to roughly its range over the samples,
+        divided by `nbins`.
+
+    \*\*Arhom_kw :
+        Arguments directly forwarded to the mean-density normalisation, :func:`A_rhom`.
+
+    Returns
+    -------
+    q : array
+        Array of shape ``(len(quantiles), len(m))``, giving the quantiles of the MRP.
+    """
+    if isinstance(m, MassGrid):
+        lnm = m.lnm
+        if mmin is None:
+            mmin = m.mmin
+    else:
+        m = np.atleast_1d(m)
+        lnm = np.log(m)
+        if mmin is None:
+            mmin = m.min()
+
+    samples = np.atleast_2d(samples)
+    quantiles = np.atleast_1d(quantiles)
+    nsamples = len(samples)
+
+    if samples.shape[1] > 3:
+        lnA = samples[:, 3]
+    else:
+        lnA = _getnorm(norm, samples[:, 0], samples[:, 1], samples[:, 2], mmin, log=True, **Arhom_kw)
+        lnA = lnA * np.ones(nsamples)
+
+    def _lndndm(i):
+        logHs, alpha, beta = [x[i:i + chunksize, np.newaxis] for x in samples.T[:3]]
+        lny = lnm - np.log(10) * logHs
+        return lnA[i:i + chunksize, np.newaxis] + np.log(beta) + alpha * lny - np.exp(beta * lny)
+
+    starts = range(0, nsamples, chunksize)
+
+    if nsamples <= chunksize:
+        out = np.percentile(_lndndm(0), 100 * quantiles, axis=0)
+    else:
+        lo = np.full(len(m), np.inf)
+        hi = np.full(len(m), -np.inf)
+        for i in starts:
+            lndndm = _lndndm(i)
+            lo = np.minimum(lo, lndndm.min(axis=0))
+            hi = np.maximum(hi, lndndm.max(axis=0))
+        width = np.where(hi > lo, (hi - lo) / nbins, 1.0)
+
+        counts = np.zeros(len(m) * nbins, dtype=int)
+        offset = nbins * np.arange(len(m))
+        for i in starts:
+            ind = np.clip(((_lndndm(i) - lo) / width).astype(int), 0, nbins - 1)
+            counts += np.bincount((ind + offset).ravel(), minlength=len(m) * nbins)
+        counts = counts.reshape((len(m), nbins))
+
+        cumcounts = np.hstack((np.zeros((len(m), 1)), np.cumsum(counts, axis=1)))
+        edges = np.arange(nbins + 1)
+        out = np.array([[lo[j] + width[j] * np.interp(q * nsamples, cumcounts[j], edges)
+                         for j in range(len(m))] for q in quantiles])
+
+    if log:
+        return out
+    else:
+        return np.exp(out)
+
+
+def _memoize(method):
+    """
+    Decorator: cache the output of an :class:`MRP` method, keyed by its arguments, until
+    any of the parameters of the MRP are re-assigned.
+    """
+    @functools.wraps(method)
+    def _wrapper(self, *args, **kwargs):
+        key = (method.__name__, args, tuple(sorted(kwargs.items())))
+        memo = self.__dict__.setdefault("_memo", {})
+        try:
+            return memo[key]
+        except KeyError:
+            memo[key] = method(self, *args, **kwargs)
+            return memo[key]
+        except TypeError:
+            # Unhashable arguments: just evaluate.
+            return method(self, *args, **kwargs)
+    return _wrapper
 
 
 class MRP(object):
@@ -241,8 +650,9 @@ class MRP(object):
 
     Parameters
     ----------
-    logm : array_like
-        Vector of log10 masses.
+    logm : array_like or :class:`MassGrid`
+        Vector of log10 masses. If a :class:`MassGrid`, its pre-computed mass arrays are
+        re-used by all methods.
 
     logHs, alpha, beta : array_like
         The shape parameters of the MRP.
@@ -260,10 +670,35 @@ class MRP(object):
 
     rhom : float, optional
         Mass density of the Universe. Only required if `norm` is set to ``Arhom``.
+
+    Notes
+    -----
+    Derived quantities (such as the real-space masses, the normalisation and the
+    vector quantities like :meth:`dndm`) are computed once and cached. Re-assigning
+    any of the defining parameters (`logm`, `logHs`, `alpha`, `beta`, `norm`,
+    `log_mmin` or `rhom`) automatically clears the cache. Modifying an array
+    parameter in-place (eg. ``mrp.logm[0] = 12``) is *not* detected, and leaves
+    stale cached values, so array parameters must be re-assigned instead. Arrays
+    returned from the cache are shared between calls, so should not be modified
+    in-place either.
     """
 
+    # Attributes which define the MRP. Re-assigning any of these clears cached quantities.
+    _parameters = ("logm", "logHs", "alpha", "beta", "_norm", "log_mmin", "_Arhom_kw")
+
+    # Cached quantities depending only on the masses, which survive changes in other parameters.
+    _mass_quantities = ("m",)
+
     def __init__(self, logm, logHs, alpha, beta, norm="pdf", log_mmin=None,
                  rhom=0.3 * 2.7755e11):
+        if isinstance(logm, MassGrid):
+            self.grid = logm
+            logm = logm.logm
+            if log_mmin is None:
+                log_mmin = self.grid.log_mmin
+        else:
+            self.grid = None
+
         self.logm = logm
         if log_mmin is not None:
             self.log_mmin = log_mmin
@@ -279,28 +714,83 @@ class MRP(object):
         self._norm = norm
         self._Arhom_kw = {"rhom": rhom}
 
+    def __setattr__(self, name, value):
+        super(MRP, self).__setattr__(name, value)
+        if name in self._parameters:
+            self._clear_cache(keep=() if name == "logm" else self._mass_quantities)
+
+    @classmethod
+    def _cached_names(cls):
+        # Names of all cached properties of the class, found once per class.
+        if "_cached_names_" not in cls.__dict__:
+            cls._cached_names_ = frozenset(k for c in cls.__mro__ for k, v in vars(c).items()
+                                           if isinstance(v, _cached))
+        return cls._cached_names_
+
+    def _clear_cache(self, keep=()):
+        """
+        Remove all cached quantities (except those in `keep`).
+        """
+        names = self._cached_names()
+        d = self.__dict__
+        for k in [k for k in d if k in names and k not in keep]:
+            del d[k]
+        d.pop("_memo", None)
+
+    @property
+    def norm(self):
+        """
+        The normalisation of the MRP, as passed to the constructor.
+        """
+        return self._norm
+
+    @norm.setter
+    def norm(self, val):
+        self._norm = val
+
     @property
+    def rhom(self):
+        """
+        Mass density of the Universe, used by the ``"rhom"`` normalisation.
+        """
+        return self._Arhom_kw["rhom"]
+
+    @rhom.setter
+    def rhom(self, val):
+        # A new dict, since re-assignment (not mutation) of _Arhom_kw clears the cache.
+        self._Arhom_kw = dict(self._Arhom_kw, rhom=val)
+
+    @property
+    def _masses(self):
+        # The mass grid, if given and logm has not since been re-assigned, else real-space masses.
+        if self.grid is not None and self.logm is self.grid.logm:
+            return self.grid
+        return self.m
+
+    @_cached
     def m(self):
         """
         Real-space masses
         """
+        if self.grid is not None and self.logm is self.grid.logm:
+            return self.grid.m
         return 10 ** self.logm
 
-    @property
+    @_cached
     def mmin(self):
         """
         Real-space truncation mass
         """
         return 10 ** self.log_mmin
 
-    @property
+    @_cached
     def Hs(self):
         """
         Real-space scale mass.
         """
         return 10 ** self.logHs
 
-    @property
+    @_cached
     def stats(self):
         """
         An object containing statistical quantities of the MRP.
@@ -309,7 +799,7 @@ class MRP(object):
         """
         return stats.TGGD(scale=self.Hs, a=self.alpha, b=self.beta, xmin=self.mmin)
 
-    @property
+    @_cached
     def lnA(self):
         """
         Natural log of the normalisation
@@ -322,7 +812,7 @@ class MRP(object):
         return _getnorm(norm, self.logHs, self.alpha, self.beta,
                         self.mmin, log=True, **self._Arhom_kw)
 
-    @property
+    @_cached
     def A(self):
         """Normalisation of the MRP"""
         return np.exp(self.lnA)
@@ -330,6 +820,7 @@ class MRP(object):
     # =============================================================================
     # Principal Vector Quantities
     # =============================================================================
+    @_memoize
     def dndm(self, log=False):
         """
         Return the MRP at `m`.
@@ -339,9 +830,10 @@ class MRP(object):
         log : logical, optional
             Whether to return the natural log of the MRP.
         """
-        return dndm(self.m, self.logHs, self.alpha, self.beta, mmin=self.log_mmin,
+        return dndm(self._masses, self.logHs, self.alpha, self.beta, mmin=self.log_mmin,
                     norm=self.A, log=log)
 
+    @_memoize
     def dndlog10m(self, log=False):
         """
         Return the MRP in log10 space at `m'.
@@ -356,7 +848,8 @@ class MRP(object):
         else:
             return self.dndm(log) + np.log(10) * self.logm + np.log(np.log(10))
 
-    def ngtm(self, log=False):
+    @_memoize
+    def ngtm(self, log=False, sorted_grid=False):
         """
         The number density greater than `mmin`.
 
@@ -364,11 +857,15 @@ class MRP(object):
         ----------
         log : logical
             Whether to return the natural log of the number density.
+
+        sorted_grid : logical, optional
+            Use the fast algorithm for dense, ascending grids of masses (see :func:`ngtm`).
         """
-        return ngtm(self.m, self.logHs, self.alpha, self.beta, mmin=self.log_mmin,
-                    norm=self.A, log=log)
+        return ngtm(self._masses, self.logHs, self.alpha, self.beta, mmin=self.log_mmin,
+                    norm=self.A, log=log, sorted_grid=sorted_grid)
 
-    def rho_gtm(self, log=False):
+    @_memoize
+    def rho_gtm(self, log=False, sorted_grid=False):
         """
         The mass-weighted integral of the MRP, in reverse (ie. from high to low mass).
 
@@ -377,14 +874,38 @@ class MRP(object):
         ----------
         log : logical
             Whether to return the natural log of the density.
+
+        sorted_grid : logical, optional
+            Use the fast algorithm for dense, ascending grids of masses (see :func:`rho_gtm`).
+        """
+        return rho_gtm(self._masses, self.logHs, self.alpha, self.beta, mmin=self.log_mmin,
+                       norm=self.A, log=log, sorted_grid=sorted_grid)
+
+    @_memoize
+    def profile(self, quantities=_profile_quantities, log=False):
+        """
+        Several vector quantities at once, sharing intermediate computations (see :func:`profile`).
+
+        Parameters
+        ----------
+        quantities : sequence of str, optional
+            The quantities to compute, any of ``"dndm"``, ``"ngtm"`` and ``"rho_gtm"``.
+
+        log : logical, optional
+            Whether to return the natural log of each quantity.
+
+        Returns
+        -------
+        dict :
+            The requested quantities, keyed by name.
         """
-        return rho_gtm(self.m, self.logHs, self.alpha, self.beta, mmin=self.log_mmin,
-                       norm=self.A, log=log)
+        return profile(self._masses, self.logHs, self.alpha, self.beta, quantities=tuple(quantities),
+                       mmin=self.mmin, norm=self.A, log=log)
 
     # =============================================================================
     # Derived Scalar Quantities
     # =============================================================================
-    @property
+    @_cached
     def _k(self):
         """
         The integral of the mass-weighted MRP down to ``M=0`` (i.e. disregarding
@@ -392,25 +913,29 @@ class MRP(object):
         """
         return entire_integral(self.logHs, self.alpha, self.beta)
 
-    @property
+    @_cached
     def log_mass_mode(self):
         """
         The mode of the log-space MRP weighted by mass
         """
         return log_mass_mode(self.logHs, self.alpha, self.beta)
 
-    @property
+    @_cached
     def nbar(self):
         """
         Total number density above truncation mass.
+
+        If the parameters of the MRP are arrays, this is an array of their broadcast shape.
         """
         return ngtm(self.mmin, self.logHs, self.alpha, self.beta, mmin=self.log_mmin,
                     norm=self.A, log=False)
 
-    @property
+    @_cached
     def rhobar(self):
         """
         Total mass density above truncation mass.
+
+        If the parameters of the MRP are arrays, this is an array of their broadcast shape.
         """
         return rho_gtm(self.mmin, self.logHs, self.alpha, self.beta, mmin=self.log_mmin,
                        norm=self.A, log=False)
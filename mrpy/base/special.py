@@ -6,6 +6,7 @@ Generally, these are adapted from `mpmath`, but return standard floats/arrays, a
 """
 
 import numpy as np
+import scipy.special as _sc
 from mpmath import gammainc as _mp_ginc
 from mpmath import gamma as _mp_g
 from mpmath import hyper as _mp_hyper
@@ -35,6 +36,92 @@ def gammainc(z,x):
 gammainc.__doc__ =  docs.format("Upper incomplete gamma",_mp_ginc.__doc__)
 
 
+def _gammainc_cf(z, x, maxiter=500):
+    # Continued fraction for the upper incomplete gamma (modified Lentz's method),
+    # which converges quickly for x > 1 and any z.
+    tiny = 1e-300
+    b = x + 1 - z
+    c = np.full_like(x, 1/tiny)
+    d = 1/b
+    h = d.copy()
+    for i in range(1, maxiter):
+        an = -i*(i - z)
+        b = b + 2
+        d = an*d + b
+        d = np.where(np.abs(d) < tiny, tiny, d)
+        c = b + an/c
+        c = np.where(np.abs(c) < tiny, tiny, c)
+        d = 1/d
+        delta = d*c
+        h = h*delta
+        if np.all(np.abs(delta - 1) < 1e-15):
+            break
+    return np.exp(z*np.log(x) - x)*h
+
+
+def gammainc_fast(z, x):
+    r"""
+    Upper incomplete gamma function, vectorised with `numpy` and `scipy` rather than `mpmath`.
+
+    This is much faster than :func:`gammainc` for array input, and supports negative `z`
+    (which `scipy` does not), so is suitable for evaluating many normalisations at once.
+
+    Parameters
+    ----------
+    z, x : array_like
+        Arguments of the function, broadcast against each other. `x` must be non-negative.
+
+    Returns
+    -------
+    array_like
+        The upper incomplete gamma function, :math:`\Gamma(z,x)`.
+
+    Notes
+    -----
+    For positive `z` this is the regularised function ``scipy.special.gammaincc``, multiplied by
+    the gamma function. For non-positive `z` and ``x > 1``, a continued fraction is used. Otherwise
+    the recurrence
+
+    .. math:: \Gamma(z,x) = \frac{\Gamma(z+1,x) - x^z e^{-x}}{z}
+
+    is applied downwards from the first positive value of `z` (or from :math:`\Gamma(0,x) = E_1(x)`
+    for integer `z`). Its first step cancels badly when `z` is just below a non-positive integer, so
+    such values (within ``1e-3``), and any results that are not finite, are re-evaluated with
+    :func:`gammainc`.
+    """
+    z, x = np.broadcast_arrays(np.asarray(z, dtype=float), np.asarray(x, dtype=float))
+    g = np.empty(z.shape)
+
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        pos = z > 0
+        g[pos] = _sc.gammaincc(z[pos], x[pos])*_sc.gamma(z[pos])
+
+        cf = ~pos & (x > 1)
+        g[cf] = _gammainc_cf(z[cf], x[cf])
+
+        rec = ~pos & ~cf
+        zr, xr = z[rec], x[rec]
+        isint = zr == np.round(zr)
+        n = np.where(isint, -zr, np.floor(-zr) + 1).astype(int)
+        s = zr + n
+        gr = np.where(isint, _sc.exp1(xr), _sc.gammaincc(np.where(isint, 1, s), xr)*_sc.gamma(np.where(isint, 1, s)))
+
+        lnx = np.log(xr)
+        for k in range(n.max() if n.size else 0):
+            sk = np.where(n > k, s - k - 1, 1)
+            gr = np.where(n > k, (gr - np.exp(sk*lnx - xr))/sk, gr)
+        g[rec] = gr
+
+    near_int = (z <= 0) & (x <= 1) & (z != np.round(z)) & (np.abs(z - np.round(z)) < 1e-3)
+    bad = (~np.isfinite(g) | near_int) & (x > 0)
+    if np.any(bad):
+        g[bad] = gammainc(z[bad], x[bad])
+
+    if g.ndim == 0:
+        return float(g)
+    return g
+
+
 # The following extends the mpmath gamma to take vector args
 _g_ufunc = np.frompyfunc(lambda z: _mp_g(z), 1, 1)
 def gamma(z):
@@ -48,8 +135,14 @@ def polygamma(m,z):
 polygamma.__doc__ = docs.format("Polygamma",_mp_pg.__doc__)
 
 
+def _underflows(z, x):
+    # Whether the Meijer-G functions below (which decay as x^(z-1) e^-x, up to powers of ln x) are smaller
+    # than the smallest float, in which case mpmath is very slow (or fails to converge).
+    return x > 1 and (z - 1)*np.log(x) - x + 3*np.log(np.log(x) + 1) < -750
+
+
 # The following extends the mpmath meijerg function to take vector args
-_g1_ufunc = np.frompyfunc(lambda z,x: _mp_mg([[], [1, 1]], [[0, 0, z], []], x),2,1)
+_g1_ufunc = np.frompyfunc(lambda z,x: 0.0 if _underflows(z, x) else _mp_mg([[], [1, 1]], [[0, 0, z], []], x),2,1)
 def G1(z,x):
     r"""
     The Meijer-G function with specific arguments: ``meijerg([[], [1, 1]], [[0, 0, z], []], x)``,
@@ -65,7 +158,8 @@ def G1(z,x):
     """
     return _flt(_g1_ufunc(z,x))
 
-_g2_ufunc = np.frompyfunc(lambda z,x: _mp_mg([[], [1, 1,1]], [[0, 0,0, z], []], x),2,1)
+_g2_ufunc = np.frompyfunc(lambda z,x: 0.0 if _underflows(z, x) else _mp_mg([[], [1, 1,1]], [[0, 0,0, z], []], x),
+                          2,1)
 def G2(z,x):
     r"""
     The Meijer-G function with specific arguments: ``meijerg([[], [1, 1,1]], [[0, 0, 0, z], []], x)``,
@@ -6,24 +6,175 @@ of interest. Specifically, the two main cases of interest are fitting the MRP
 to a sample of data (``SampleLike``) or fitting to a binned (or theoretical) curve.
 
 At this point, the classes here only support the simplest possible cases, in which
-the effective volume is constant as a function of mass, down to some threshold truncation mass.
-Furthermore, only data without measurement error is supported at this point.
+the effective volume is constant as a function of mass, down to some threshold truncation mass,
+or tabulated as a function of mass (``SelectionFunction``). Histogrammed samples are fit with
+``BinnedPoissonLike``. Data with log-normal measurement errors are supported by ``SampleLikeErrors``.
 
 At this time, we don't directly support fitting MRP extensions, such as a double-MRP.
 """
 
+import atexit
+import copy
+import os
 import mrpy.base.special as sp
 from mrpy.base import core
+from multiprocessing.pool import ThreadPool
+import mmap
+import warnings
 import numpy as np
+from numpy.polynomial import chebyshev as _cheb
 import scipy.integrate as intg
 from cached_property import cached_property as _cached
 from mrpy.base import stats
 from mrpy import MRP
+from mrpy._utils import load_array
 from scipy.special import gamma
 
 ln10 = np.log(10)
 
 
+# Default number of masses per block, when evaluating over multiple threads.
+_DEFAULT_CHUNKSIZE = 2 ** 20
+
+# Thread pools by size, and the process which created them.
+_thread_pools = {}
+_thread_pools_pid = [os.getpid()]
+
+
+def _thread_pool(n_threads):
+    """
+    A pool of `n_threads` threads, created once (per process) and re-used for every evaluation.
+    """
+    if _thread_pools_pid[0] != os.getpid():
+        # A forked child inherits the pools, but not their threads, so must create its own.
+        _thread_pools.clear()
+        _thread_pools_pid[0] = os.getpid()
+    if n_threads not in _thread_pools:
+        _thread_pools[n_threads] = ThreadPool(n_threads)
+    return _thread_pools[n_threads]
+
+
+@atexit.register
+def _close_thread_pools():
+    """
+    Close and join the thread pools of this process.
+    """
+    if _thread_pools_pid[0] == os.getpid():
+        for pool in _thread_pools.values():
+            pool.close()
+            pool.join()
+    _thread_pools.clear()
+
+
+def _chunksize_for(data, chunksize):
+    """
+    The size of blocks in which to process `data`. Memory-mapped data is always processed in blocks, whose
+    size is rounded up to a whole number of memory pages (the blocks are not aligned to page boundaries, since
+    the data of a ``.npy`` file follows its header).
+    """
+    if isinstance(data, np.memmap):
+        page = max(mmap.PAGESIZE // data.itemsize, 1)
+        chunksize = chunksize or _DEFAULT_CHUNKSIZE
+        return page * max(int(np.ceil(chunksize / float(page))), 1)
+    return chunksize
+
+
+def _blocks(n, chunksize):
+    """
+    Slices dividing ``range(n)`` into consecutive blocks of (at most) `chunksize`.
+    """
+    return [slice(i, min(i + chunksize, n)) for i in range(0, n, chunksize)]
+
+
+def _profile_hessian(hess):
+    """
+    The hessian with respect to `logHs`, `alpha` and `beta`, of a likelihood profiled over `lnA`, given its
+    full (4x4) hessian at the profiled `lnA`.
+    """
+    return hess[:3, :3] - np.outer(hess[:3, 3], hess[3, :3]) / hess[3, 3]
+
+
+class SelectionFunction(object):
+    r"""
+    A tabulated effective volume, :math:`V(m)`, for likelihoods of incomplete samples.
+
+    Between the tabulated masses, :math:`V` is interpolated linearly in log-mass. Below the first
+    tabulated mass it is zero, and above the last it is constant (ie. the sample is taken to be complete
+    at high mass).
+
+    The expected number of objects above a truncation mass, :math:`\int V(m) g(m) dm`, is computed by
+    Gauss-Legendre quadrature of fixed `order` on each interval of the table, plus the analytic integral
+    of :math:`g` above the last tabulated mass. The nodes and weights (which absorb :math:`V`) depend only
+    on the table and the truncation mass, so they are computed once and re-used for any parameters.
+
+    Parameters
+    ----------
+    logm : array_like
+        Increasing log10 masses at which `V` is tabulated.
+
+    V : array_like
+        The effective volume at each of `logm`. Must be non-negative.
+
+    order : int, optional
+        Number of quadrature nodes in each interval of the table.
+    """
+
+    def __init__(self, logm, V, order=8):
+        self.logm = np.asarray(logm, dtype=float)
+        self.V = np.asarray(V, dtype=float)
+        self.order = order
+
+        if self.logm.ndim != 1 or self.logm.shape != self.V.shape:
+            raise ValueError("logm and V must be 1D arrays of the same length")
+        if np.any(np.diff(self.logm) <= 0):
+            raise ValueError("logm must be strictly increasing")
+        if np.any(self.V < 0):
+            raise ValueError("V must be non-negative")
+
+        self._nodes = {}
+
+    def __call__(self, logm):
+        """
+        The effective volume at log10 masses `logm`.
+        """
+        return np.interp(logm, self.logm, self.V, left=0, right=self.V[-1])
+
+    @property
+    def V_max(self):
+        """
+        The (constant) effective volume above the last tabulated mass.
+        """
+        return self.V[-1]
+
+    def nodes(self, log_mmin):
+        """
+        Quadrature nodes and weights for the integral of ``V(m)g(m)`` between `log_mmin` and the last
+        tabulated mass.
+
+        Returns
+        -------
+        logm : array
+            Log10 masses of the nodes.
+
+        weights : array
+            The weights, such that the integral is ``sum(weights * g(10**logm))``.
+        """
+        key = float(log_mmin)
+        if key not in self._nodes:
+            edges = np.concatenate(([key], self.logm[self.logm > key]))
+            if len(edges) < 2:
+                self._nodes[key] = (np.array([]), np.array([]))
+            else:
+                x, w = np.polynomial.legendre.leggauss(self.order)
+                lo, hi = edges[:-1, None], edges[1:, None]
+                logm = (0.5 * (hi - lo) * x + 0.5 * (hi + lo)).flatten()
+                dlogm = (0.5 * (hi - lo) * w).flatten()
+
+                # dm = ln(10) m dlogm
+                self._nodes[key] = (logm, dlogm * ln10 * 10 ** logm * self(logm))
+        return self._nodes[key]
+
+
 class SampleLike(core.MRP):
     """
     A subclass of :class:`mrpy.core.MRP` which adds the likelihood (and derivatives)
@@ -38,8 +189,10 @@ class SampleLike(core.MRP):
 
     Parameters
     ----------
-    logm : array_like
-        Vector of log10 masses.
+    logm : array_like or str
+        Vector of log10 masses. May be a :class:`numpy.memmap`, or the path to a ``.npy``
+        file (which is memory-mapped), in which case it is always processed in blocks
+        (see `chunksize`), and never read into memory in full.
 
     logHs, alpha, beta, lnA : array_like
         The parameters of the MRP.
@@ -50,6 +203,22 @@ class SampleLike(core.MRP):
 
     rhom : float
         Mass density of the universe. Only used if the normalisation is set to ``Arhom``.
+
+    chunksize : int, optional
+        If given, :attr:`lnL`, :attr:`jacobian` and :attr:`hessian` are accumulated over blocks of
+        this many masses at a time, so that the memory they require is proportional to `chunksize`
+        rather than the size of the sample. Full-length arrays (eg. :attr:`_lng`) are then only
+        computed if explicitly accessed.
+
+    n_threads : int, optional
+        Number of threads over which to divide the blocks of masses (of size `chunksize`, or
+        a default of ``2**20`` if not given). Partial sums are always combined in the same
+        order, so that the results do not depend on the number of threads.
+
+    selection : :class:`SelectionFunction`, optional
+        A mass-dependent effective volume. If given, the expected number of objects is the integral of
+        ``V(m) g(m)`` (rather than of ``g(m)``) above the truncation mass. The likelihood then omits the
+        sum of ``ln V`` over the sample, which is independent of the parameters.
     """
 
     # Internally, some of the properties are defined twice -- once for the
@@ -58,19 +227,29 @@ class SampleLike(core.MRP):
     # or just the truncation mass. Throughout, quantities that are defined as the
     # truncation mass have an extra trailing underscore in their name.
 
-    def __init__(self, logm, logHs, alpha, beta, lnA, log_mmin=None, rhom =0.3 * 2.7755e11):
+    def __init__(self, logm, logHs, alpha, beta, lnA, log_mmin=None, rhom =0.3 * 2.7755e11, chunksize=None,
+                 n_threads=1, selection=None):
+        logm = load_array(logm)
         super(SampleLike, self).__init__(logm, logHs, alpha, beta, lnA, log_mmin, rhom=rhom)
+        self.chunksize = _chunksize_for(logm, chunksize)
+        self.n_threads = n_threads
+        self.selection = selection
+
+    # Index pairs (into "habA") of the 10 unique entries of a symmetric hessian.
+    _hess_pairs = [(i, j) for i in range(4) for j in range(i, 4)]
 
     def _getjac(self, var):
-        X, Y = np.meshgrid(list(range(4)), list(range(4)))
-        out = np.array(
-            [getattr(self, "_%s_%s_%s%s"%(var.replace("_", ""), "habA"[min(x, y)], "habA"[max(x, y)],"_" if var.endswith("_") else "")) for x, y in
-             zip(X.flatten(), Y.flatten())])
+        """
+        Assemble the symmetric hessian of quantity `var` from its 10 unique second derivatives.
+        """
+        trailing = "_" if var.endswith("_") else ""
+        entries = [getattr(self, "_%s_%s_%s%s" % (var.replace("_", ""), "habA"[i], "habA"[j], trailing))
+                   for i, j in self._hess_pairs]
 
-        if var.endswith("_"):
-            return out.reshape((4, 4))
-        else:
-            return out.reshape((4, 4, len(self.m)))
+        out = np.empty((4, 4) + np.broadcast(*entries).shape)
+        for (i, j), e in zip(self._hess_pairs, entries):
+            out[i, j] = out[j, i] = e
+        return out
 
     # ===========================================================================
     # Basic unit quantities
@@ -110,6 +289,13 @@ class SampleLike(core.MRP):
         """
         return self._y**self.beta
 
+    @_cached
+    def _lny(self):
+        """
+        Natural log of the scaled masses
+        """
+        return np.log(self._y)
+
     # ===========================================================================
     # Cached special functions
     # ===========================================================================
@@ -234,13 +420,172 @@ class SampleLike(core.MRP):
         """
         return np.log(self._q_)
 
+    # ===========================================================================
+    # Expected number of objects, with a selection function
+    # ===========================================================================
+    @_cached
+    def _node_like(self):
+        """
+        The model at the quadrature nodes of the selection function.
+        """
+        logm, _ = self.selection.nodes(self.log_mmin)
+        return SampleLike(logm, self.logHs, self.alpha, self.beta, self.lnA, self.log_mmin, **self._Arhom_kw)
+
+    @_cached
+    def _node_gw(self):
+        """
+        The model at the quadrature nodes, multiplied by the quadrature weights.
+        """
+        _, w = self.selection.nodes(self.log_mmin)
+        return w * np.exp(self._node_like._lng) if len(w) else w
+
+    @_cached
+    def _tail_like(self):
+        """
+        The model truncated at the greater of the truncation mass and the last tabulated selection mass,
+        above which the effective volume is constant.
+        """
+        log_top = max(self.log_mmin, self.selection.logm[-1])
+        return SampleLike(np.atleast_1d(log_top), self.logHs, self.alpha, self.beta, self.lnA, log_top,
+                          **self._Arhom_kw)
+
+    @_cached
+    def _Q(self):
+        """
+        The expected number of objects above the truncation mass (ie. the integral of V*g, in units of
+        the volume if there is no selection function).
+        """
+        if self.selection is None:
+            return self._q_
+        return np.sum(self._node_gw) + self.selection.V_max * self._tail_like._q_
+
+    @_cached
+    def _Q_jac(self):
+        if self.selection is None:
+            return self._q_jac_
+        node_jac = np.dot(self._node_like._lng_jac, self._node_gw) if len(self._node_gw) else 0
+        return node_jac + self.selection.V_max * self._tail_like._q_jac_
+
+    @_cached
+    def _Q_hess(self):
+        if self.selection is None:
+            return self._q_hess_
+        node_hess = 0
+        if len(self._node_gw):
+            jac = self._node_like._lng_jac
+            node_hess = np.dot(self._node_like._lng_hess + jac[:, None] * jac[None, :], self._node_gw)
+        return node_hess + self.selection.V_max * self._tail_like._q_hess_
+
+    @_cached
+    def _W(self):
+        """
+        The total weight of the sample (ie. the number of masses).
+        """
+        return self._lng_sums[0]
+
+    def profile_lnA(self):
+        """
+        The likelihood maximised over `lnA`, with its derivatives with respect to `logHs`, `alpha` and `beta`.
+
+        The likelihood is maximised where the expected number of masses equals the total weight, at which point
+        the derivative with respect to `lnA` vanishes, so that the jacobian is simply that of the other three
+        parameters. Furthermore, with a uniform prior on `lnA`, the marginal likelihood differs from this profile
+        likelihood by a constant, so it may be used for sampling the other three parameters.
+
+        Returns
+        -------
+        lnA : float
+            The maximum-likelihood `lnA`, given the other parameters.
+
+        lnL : float
+            The profile log-likelihood.
+
+        jac : array
+            The jacobian of the profile likelihood, a 3-vector.
+
+        hess : array
+            The hessian of the profile likelihood, a 3x3 matrix.
+        """
+        other = copy.copy(self)
+        other.norm = self.lnA + np.log(self._W) - np.log(self._Q)
+
+        # The sums over masses don't depend on lnA, so need not be recomputed.
+        if "_lng_sums" in self.__dict__:
+            other.__dict__["_lng_sums"] = self._lng_sums
+
+        return other.lnA, other.lnL, other.jacobian[:3], _profile_hessian(other.hessian)
+
+    # ===========================================================================
+    # Weighted sums over masses
+    # ===========================================================================
+    def _lng_moments(self, w):
+        r"""
+        Sums over all masses of :math:`(1, x, \ln y, x \ln y, x \ln^2 y)`, each weighted by `w`.
+
+        The sum of :math:`w \ln g`, and its jacobian and hessian, are all linear combinations of
+        these five terms (see :meth:`_lng_jac_from` and :meth:`_lng_hess_from`).
+        """
+        if self.chunksize is None and self.n_threads == 1:
+            return self._block_moments(self._lny, self._x, w)
+
+        def block(sl):
+            y = 10 ** self.logm[sl] / self.Hs
+            return self._block_moments(np.log(y), y ** self.beta, w if np.isscalar(w) else w[sl])
+
+        blocks = _blocks(len(self.logm), self.chunksize or _DEFAULT_CHUNKSIZE)
+        if self.n_threads > 1:
+            partial = _thread_pool(self.n_threads).map(block, blocks)
+        else:
+            partial = map(block, blocks)
+
+        # Reduce in a fixed order, for reproducibility.
+        out = np.zeros(5)
+        for p in partial:
+            out += p
+        return out
+
+    @staticmethod
+    def _block_moments(lny, x, w):
+        # The moments of _lng_moments, for a block of masses.
+        xl = x * lny
+        if np.isscalar(w):
+            return w * np.array([lny.size, np.sum(x), np.sum(lny), np.sum(xl), np.dot(xl, lny)])
+        else:
+            return np.array([np.sum(w), np.dot(w, x), np.dot(w, lny), np.dot(w, xl), np.dot(w * xl, lny)])
+
+    @_cached
+    def _lng_sums(self):
+        """
+        The moments of :meth:`_lng_moments`, weighted by the number of each mass.
+        """
+        return self._lng_moments(self._scaled_mass)
+
+    def _lng_jac_from(self, s):
+        """
+        The weighted sum of the jacobian of ln(g), from the moments `s`.
+        """
+        b = self.beta
+        return np.array([ln10 * (b * s[1] - self.alpha * s[0]), s[2], (s[0] - b * s[3]) / b, s[0]])
+
+    def _lng_hess_from(self, s):
+        """
+        The weighted sum of the hessian of ln(g), from the moments `s`.
+        """
+        b = self.beta
+        out = np.zeros((4, 4))
+        out[0, 0] = -ln10 ** 2 * b ** 2 * s[1]
+        out[0, 1] = out[1, 0] = -ln10 * s[0]
+        out[0, 2] = out[2, 0] = ln10 * (s[1] + b * s[3])
+        out[2, 2] = -s[0] / b ** 2 - s[4]
+        return out
 
     @property
     def lnL(self):
         """
         Total log-likelihood with current model for masses m [uniform prior]
         """
-        return np.sum(self._scaled_mass * self._lng) - self._q_
+        s = self._lng_sums
+        return (self.lnA + np.log(self.beta)) * s[0] + self.alpha * s[2] - s[1] - self._Q
 
     # ===========================================================================
     # Simple Derivatives
@@ -264,7 +609,7 @@ class SampleLike(core.MRP):
 
     @_cached
     def _lng_a(self):
-        return np.log(self._y)
+        return self._lny
 
     @_cached
     def _lng_a_(self):
@@ -541,7 +886,7 @@ class SampleLike(core.MRP):
 
         See Murray, Power, Robotham Appendix for details. This is a 3-vector.
         """
-        return np.sum(self._scaled_mass * self._lng_jac,axis=1) - self._q_jac_
+        return self._lng_jac_from(self._lng_sums) - self._Q_jac
 #        return np.sum(self._scaled_mass * np.array([self._Q_x(x) for x in "habA"]), axis=1)
 
     @property
@@ -553,7 +898,7 @@ class SampleLike(core.MRP):
 
         See Murray, Power, Robotham Appendix for details. This is a 3x3 matrix.
         """
-        return np.sum(self._scaled_mass * self._lng_hess, axis=2) - self._q_hess_#/self._mean_scaling
+        return self._lng_hess_from(self._lng_sums) - self._Q_hess
 
     @property
     def cov(self):
@@ -593,9 +938,9 @@ class SampleLikeWeights(SampleLike):
 
     Parameters
     ----------
-    weights : array_like
+    weights : array_like or str
         Array of the same length as ``m``, giving the number of each mass in the
-        distribution.
+        distribution. May be a :class:`numpy.memmap` or the path to a ``.npy`` file.
 
     Other Parameters
     ----------------
@@ -605,13 +950,614 @@ class SampleLikeWeights(SampleLike):
 
     def __init__(self, weights, *args, **kwargs):
         super(SampleLikeWeights, self).__init__(*args, **kwargs)
-        self.weights = weights
+        self.weights = load_array(weights)
 
     @_cached
     def _scaled_mass(self):
         return self.weights
 
 
+class SampleSummary(object):
+    r"""
+    Sufficient statistics of a (weighted) sample of masses, from which :class:`SampleLikeSummary`
+    evaluates the likelihood and its derivatives in a time independent of the size of the sample.
+
+    The likelihood requires sums over the sample of :math:`w`, :math:`w\ln m` (which are constant) and
+    of :math:`w x`, :math:`w x \ln m` and :math:`w x\ln^2 m`, where :math:`x = (m/H_s)^\beta`. The latter
+    factor as :math:`H_s^{-\beta}` times a function of :math:`\beta` alone, :math:`S(\beta) = \sum w m^\beta`,
+    or one of its first two derivatives. These are represented by Chebyshev interpolants over
+    `beta_bounds`, whose degree is increased until they converge. Outside of `beta_bounds`, the sums
+    are computed directly.
+
+    Parameters
+    ----------
+    logm : array_like or str
+        Vector of log10 masses, or the path to a ``.npy`` file containing them (which is memory-mapped).
+
+    weights : array_like or str, optional
+        Number of each mass in the sample (or the path to a ``.npy`` file of them). By default, each mass
+        is counted once.
+
+    log_mmin : float, optional
+        Log-10 truncation mass. By default the minimum of `logm`. Masses below this are ignored.
+
+    beta_bounds : 2-tuple, optional
+        The range of :math:`\beta` over which to interpolate.
+
+    tol : float, optional
+        Relative size of the trailing Chebyshev coefficients at which the interpolants are deemed converged.
+
+    max_nodes : int, optional
+        Maximum number of interpolation nodes. If the interpolants have not converged when it is reached, a
+        :class:`RuntimeWarning` is issued.
+
+    chunksize : int, optional
+        Number of masses to process at a time. By default, all at once for in-memory arrays, and blocks of
+        about ``2**20`` masses for memory-mapped arrays, which are never read into memory
+        in full.
+    """
+
+    # Whether the data passed on creation are log10 masses (rather than masses).
+    _is_log = True
+
+    def __init__(self, logm, weights=None, log_mmin=None, beta_bounds=(0.1, 2.0), tol=1e-14, max_nodes=256,
+                 chunksize=None):
+        data = load_array(logm)
+        self.chunksize = _chunksize_for(data, chunksize)
+        self.beta_bounds = beta_bounds
+
+        if log_mmin is None:
+            log_mmin = np.min(data) if self._is_log else np.log10(np.min(data))
+        self.log_mmin = log_mmin
+
+        # Each source of data is a tuple of (masses, weights, whether masses are log10).
+        self._sources = [(data, load_array(weights), self._is_log)]
+
+        # Constant sums, and the maximum mass, by which masses are scaled so that sums can't overflow.
+        self.W, self.sum_lnm, self.lnm_ref = 0.0, 0.0, -np.inf
+        self.lnm_ref = self._accumulate(self._sources)
+
+        self._fit(tol, max_nodes)
+
+    @classmethod
+    def from_masses(cls, m, weights=None, mmin=None, **kwargs):
+        """
+        Create a summary from real-space masses `m` (rather than log10 masses), which may be the path to a
+        ``.npy`` file. Logarithms are taken one block at a time, so memory-mapped masses are never copied
+        into memory in full. Other arguments are as for :class:`SampleSummary`.
+        """
+        self = cls.__new__(cls)
+        self._is_log = False
+        self.__init__(m, weights, None if mmin is None else np.log10(mmin), **kwargs)
+        return self
+
+    def append(self, logm, weights=None):
+        """
+        Add masses to the sample, in a time proportional to their number.
+
+        The constant sums are updated, and the Chebyshev interpolants are re-fit at their existing nodes
+        after adding the contribution of the new masses alone. If the new fit has not converged, more nodes
+        are added as on creation. Masses below the truncation mass are ignored.
+        The new masses are retained (but not re-read) to evaluate the sums exactly outside `beta_bounds`.
+
+        Parameters
+        ----------
+        logm : array_like
+            Vector of new log10 masses. Repeated masses are compacted into a table of unique masses
+            and their total weights.
+
+        weights : array_like, optional
+            Number of each new mass. By default, each is counted once.
+        """
+        logm, inv = np.unique(np.asarray(logm, dtype=float), return_inverse=True)
+        weights = np.bincount(inv, weights=weights)
+        source = [(logm, weights, True)]
+
+        lnm_ref = self._accumulate(source)
+        if lnm_ref > self.lnm_ref:
+            # Re-scale the existing sums to the new maximum mass.
+            d = lnm_ref - self.lnm_ref
+            b = self._to_beta(self._nodes)
+            T, T1, T2 = self._node_sums.T
+            self._node_sums = np.exp(-b * d)[:, np.newaxis] * np.column_stack((T, T1 - d * T,
+                                                                               T2 - 2 * d * T1 + d ** 2 * T))
+            self.lnm_ref = lnm_ref
+
+        self._node_sums = self._node_sums + self._sums(self._to_beta(self._nodes), source)
+        self._sources += source
+        self._refine(self._nodes, self._node_sums)
+
+    def _accumulate(self, sources):
+        # Add the constant sums of the given sources to the totals, and return the maximum ln mass.
+        lnm_ref = self.lnm_ref
+        for lnm, w in self._iter_blocks(sources):
+            self.W += lnm.size if w is None else np.sum(w)
+            self.sum_lnm += np.sum(lnm) if w is None else np.dot(w, lnm)
+            if lnm.size:
+                lnm_ref = max(lnm_ref, lnm.max())
+        return lnm_ref
+
+    def _iter_blocks(self, sources=None):
+        """
+        Yield the natural log of the masses above the truncation mass, and their weights (or None),
+        one block at a time.
+        """
+        for data, weights, is_log in (self._sources if sources is None else sources):
+            n = len(data)
+            threshold = self.log_mmin if is_log else 10 ** self.log_mmin
+            for sl in _blocks(n, self.chunksize or max(n, 1)):
+                d = np.asarray(data[sl], dtype=float)
+                w = None if weights is None else np.asarray(weights[sl], dtype=float)
+                mask = d >= threshold
+                if not np.all(mask):
+                    d = d[mask]
+                    w = None if w is None else w[mask]
+                yield (d * ln10 if is_log else np.log(d)), w
+
+    def _sums(self, beta, sources=None):
+        r"""
+        For each `beta`, :math:`T_k = \sum w u^\beta \ln^k u` for k=0,1,2, with :math:`u` the masses scaled by
+        the maximum. The data is read just once for all `beta`.
+        """
+        T = np.zeros((len(beta), 3))
+        for lnm, w in self._iter_blocks(sources):
+            lnu = lnm - self.lnm_ref
+            for i, b in enumerate(beta):
+                e = np.exp(b * lnu)
+                if w is not None:
+                    e *= w
+                el = e * lnu
+                T[i] += [np.sum(e), np.sum(el), np.dot(el, lnu)]
+        return T
+
+    @staticmethod
+    def _moments_from(T):
+        # ln T, T1/T and T2/T from the sums of _sums.
+        return np.column_stack((np.log(T[:, 0]), T[:, 1] / T[:, 0], T[:, 2] / T[:, 0]))
+
+    def _tilted(self, beta):
+        r"""
+        For each `beta`, :math:`\ln T`, :math:`T_1/T` and :math:`T_2/T` (see :meth:`_sums`).
+        """
+        return self._moments_from(self._sums(beta))
+
+    def _fit(self, tol, max_nodes):
+        self._tol, self._max_nodes = tol, max_nodes
+        t = np.cos(np.pi * np.arange(17) / 16)
+        self._refine(t, self._sums(self._to_beta(t)))
+
+    def _refine(self, t, sums):
+        # Chebyshev interpolants of the tilted moments, given their sums at the extrema `t` of a Chebyshev
+        # polynomial. The polynomial is doubled in degree (the extrema are nested, so no node is evaluated
+        # twice) until the interpolants converge.
+        n = len(t) - 1
+        while True:
+            coeffs = _cheb.chebfit(t, self._moments_from(sums), n)
+            tail = np.max(np.abs(coeffs[-3:]), axis=0) / np.max(np.abs(coeffs), axis=0)
+            if np.all(tail < self._tol) or 2 * n + 1 > self._max_nodes:
+                break
+
+            # Add the new odd nodes of the doubled grid.
+            n *= 2
+            tnew = np.cos(np.pi * np.arange(1, n, 2) / n)
+            t = np.concatenate((t, tnew))
+            sums = np.concatenate((sums, self._sums(self._to_beta(tnew))))
+
+        if not np.all(tail < self._tol):
+            warnings.warn("SampleSummary interpolants did not converge to tol=%s with %s nodes (relative size "
+                          "of trailing coefficients %s); increase max_nodes or narrow beta_bounds"
+                          % (self._tol, len(t), tail.max()), RuntimeWarning)
+        self._nodes, self._node_sums, self._coeffs = t, sums, coeffs
+
+    def _to_beta(self, t):
+        lo, hi = self.beta_bounds
+        return lo + (hi - lo) * (t + 1) / 2
+
+    def _interp(self, beta):
+        # The tilted moments of _tilted, for an array of beta, interpolated where possible.
+        beta = np.asarray(beta, dtype=float)
+        b = beta.ravel()
+        lo, hi = self.beta_bounds
+        inside = (b >= lo) & (b <= hi)
+
+        out = np.empty((3, b.size))
+        out[:, inside] = _cheb.chebval(2 * (b[inside] - lo) / (hi - lo) - 1, self._coeffs)
+        if not np.all(inside):
+            out[:, ~inside] = self._tilted(b[~inside]).T
+        return out.reshape((3,) + beta.shape)
+
+    def moments(self, logHs, beta):
+        """
+        The weighted sums over the sample required by :meth:`SampleLike._lng_moments`.
+
+        `logHs` and `beta` may be arrays, in which case the result has a leading axis of length 5,
+        followed by their broadcast shape.
+        """
+        lnT, mu1, mu2 = self._interp(beta)
+
+        # Log of the reference mass in units of Hs.
+        c = self.lnm_ref - logHs * ln10
+        s1 = np.exp(beta * c + lnT)
+        return np.array(np.broadcast_arrays(self.W, s1, self.sum_lnm - self.W * logHs * ln10, s1 * (mu1 + c),
+                                            s1 * (mu2 + 2 * c * mu1 + c ** 2)))
+
+    def lnL(self, logHs, alpha, beta, lnA, selection=None):
+        """
+        The log-likelihood of the sample (as given by :attr:`SampleLike.lnL`), vectorised over broadcastable
+        arrays of parameters.
+
+        This requires no :class:`SampleLike` instances, and evaluates the normalisation with
+        :func:`mrpy.base.special.gammainc_fast`, so that many parameter sets (eg. the walkers of an
+        ensemble MCMC) may be evaluated in a single pass. If a `selection` function is given, the
+        normalisation is that of :meth:`expected_number`.
+        """
+        s = self.moments(logHs, beta)
+        q = self.expected_number(logHs, alpha, beta, lnA, selection)
+        return (lnA + np.log(beta)) * s[0] + alpha * s[2] - s[1] - q
+
+    def expected_number(self, logHs, alpha, beta, lnA, selection=None):
+        """
+        The expected number of masses above the truncation mass, vectorised over broadcastable arrays of parameters.
+
+        If a :class:`SelectionFunction` is given, this is the integral of ``V*g``, by the quadrature nodes of
+        the selection function (evaluated for all parameters at once) and the analytic tail above them.
+        """
+        Hs = 10 ** logHs
+        if selection is None:
+            return np.exp(lnA) * Hs * sp.gammainc_fast((alpha + 1) / beta, (10 ** self.log_mmin / Hs) ** beta)
+
+        logHs, alpha, beta, lnA = [np.asarray(x, dtype=float)[..., np.newaxis]
+                                   for x in np.broadcast_arrays(logHs, alpha, beta, lnA)]
+        logm, w = selection.nodes(self.log_mmin)
+        lny = (logm - logHs) * ln10
+        nodes = np.sum(w * np.exp(lnA + np.log(beta) + alpha * lny - np.exp(beta * lny)), axis=-1)
+
+        log_top = max(self.log_mmin, selection.logm[-1])
+        Hs = 10 ** logHs[..., 0]
+        beta, alpha, lnA = beta[..., 0], alpha[..., 0], lnA[..., 0]
+        tail = np.exp(lnA) * Hs * sp.gammainc_fast((alpha + 1) / beta, (10 ** log_top / Hs) ** beta)
+        return nodes + selection.V_max * tail
+
+
+class SampleLikeSummary(SampleLike):
+    """
+    Equivalent to :class:`SampleLikeWeights`, but with the likelihood and its derivatives computed from a
+    :class:`SampleSummary`, in a time independent of the size of the sample.
+
+    The summary need only be computed once per sample, and is re-used for any parameters, so this is
+    most useful where the likelihood is evaluated many times (eg. in MCMC) for a large sample.
+
+    Parameters
+    ----------
+    summary : :class:`SampleSummary`
+        The summary of the sample.
+
+    logHs, alpha, beta, lnA : array_like
+        The parameters of the MRP.
+
+    rhom : float
+        Mass density of the universe. Only used if the normalisation is set to ``Arhom``.
+
+    selection : :class:`SelectionFunction`, optional
+        A mass-dependent effective volume (see :class:`SampleLike`).
+
+    Notes
+    -----
+    Only the truncation mass is stored as ``logm``, so that per-mass quantities (eg. :meth:`dndm`)
+    refer only to it.
+    """
+
+    def __init__(self, summary, logHs, alpha, beta, lnA, rhom=0.3 * 2.7755e11, selection=None):
+        super(SampleLikeSummary, self).__init__(np.atleast_1d(summary.log_mmin), logHs, alpha, beta, lnA,
+                                                summary.log_mmin, rhom=rhom, selection=selection)
+        self.summary = summary
+
+    @_cached
+    def _lng_sums(self):
+        return self.summary.moments(self.logHs, self.beta)
+
+
+class SampleLikeErrors(SampleLike):
+    r"""
+    A :class:`SampleLike` for masses with log-normal measurement errors.
+
+    The true masses are assumed to follow the MRP, truncated at `log_mmin`, and each observed log10 mass
+    to be drawn from a normal distribution centred on the true log10 mass, with standard deviation
+    `sigma` (in dex). The density of each observed log-mass is the MRP (in log-space) convolved with this
+    kernel, which is computed by FFT on a uniform grid of log-mass, and interpolated to each object. The
+    likelihood is normalised such that it reduces to that of :class:`SampleLike` as `sigma` tends to zero.
+
+    The jacobian and hessian are computed in the same way, by convolving the derivatives of the MRP, and
+    are exact derivatives of the (discretised) likelihood.
+
+    Parameters
+    ----------
+    logm : array_like
+        Vector of observed log10 masses.
+
+    sigma : float or array_like
+        The uncertainty of the log10 masses, in dex, either for all masses or for each individually.
+        Must be positive.
+
+    logHs, alpha, beta, lnA : array_like
+        The parameters of the MRP.
+
+    log_mmin : float, optional
+        Log-10 truncation mass of the true masses. By default is set to the minimum mass in ``logm``.
+
+    weights : array_like, optional
+        The number of each mass in the sample. By default, each mass is counted once.
+
+    n_sigma : int, optional
+        If `sigma` has more than this many unique values, the convolution is performed for `n_sigma`
+        values (uniformly spaced in variance) and interpolated between them.
+
+    dlogm : float, optional
+        Spacing of the log-mass grid. By default, a twentieth of the smallest `sigma` (but no more than 0.005).
+
+    rhom : float
+        Mass density of the universe. Only used if the normalisation is set to ``Arhom``.
+    """
+
+    # Number of standard deviations by which the grid extends beyond the data.
+    _n_sd = 8
+
+    def __init__(self, logm, sigma, logHs, alpha, beta, lnA, log_mmin=None, weights=None, n_sigma=16,
+                 dlogm=None, rhom=0.3 * 2.7755e11):
+        super(SampleLikeErrors, self).__init__(logm, logHs, alpha, beta, lnA, log_mmin, rhom=rhom)
+        self.sigma = sigma
+        self.weights = weights
+        self.n_sigma = n_sigma
+        self.dlogm = dlogm
+
+    @_cached
+    def _scaled_mass(self):
+        return 1 if self.weights is None else self.weights
+
+    # ===========================================================================
+    # Grids
+    # ===========================================================================
+    @_cached
+    def _sigma_levels(self):
+        """
+        The values of sigma for which the convolution is performed.
+        """
+        levels = np.unique(self.sigma)
+        if len(levels) > self.n_sigma:
+            levels = np.sqrt(np.linspace(levels[0] ** 2, levels[-1] ** 2, self.n_sigma))
+        return levels
+
+    @_cached
+    def _grid(self):
+        """
+        The uniform grid of log10 mass on which the convolution is performed.
+        """
+        dlogm = self.dlogm or min(self._sigma_levels[0] / 20., 0.005)
+        pad = self._n_sd * self._sigma_levels[-1]
+
+        # The truncation mass is placed exactly on the grid.
+        lo = self.log_mmin - dlogm * np.ceil((self.log_mmin - min(np.min(self.logm), self.log_mmin) + pad) / dlogm)
+        n = int(np.ceil((np.max(self.logm) + pad - lo) / dlogm)) + 1
+        return lo + dlogm * np.arange(n)
+
+    @_cached
+    def _interp_weights(self):
+        """
+        Indices and weights for bilinear interpolation of a (sigma level, grid) table to each object.
+        """
+        grid = self._grid
+        j = (self.logm - grid[0]) / (grid[1] - grid[0])
+        j0 = np.clip(np.floor(j).astype(int), 0, len(grid) - 2)
+
+        levels = self._sigma_levels
+        if len(levels) == 1:
+            l0, fl = np.zeros_like(j0), np.zeros_like(j)
+        else:
+            v = np.broadcast_to(np.asarray(self.sigma, dtype=float) ** 2, j.shape)
+            l = np.interp(v, levels ** 2, np.arange(len(levels)))
+            l0 = np.clip(np.floor(l).astype(int), 0, len(levels) - 2)
+            fl = l - l0
+        return j0, j - j0, l0, fl
+
+    def _interp(self, table):
+        # Bilinear interpolation of a (sigma level, grid) table to each object.
+        j0, fj, l0, fl = self._interp_weights
+        l1 = np.minimum(l0 + 1, len(table) - 1)
+        lo = table[l0, j0] * (1 - fj) + table[l0, j0 + 1] * fj
+        hi = table[l1, j0] * (1 - fj) + table[l1, j0 + 1] * fj
+        return lo * (1 - fl) + hi * fl
+
+    def _convolve(self, fields):
+        """
+        Convolve each of `fields` (defined on the grid) with a gaussian of each width in the sigma levels.
+        Returns an array of shape ``(len(fields), n_sigma_levels, len(grid))``.
+        """
+        grid = self._grid
+        n = len(grid)
+        nfft = n + int(np.ceil(self._n_sd * self._sigma_levels[-1] / (grid[1] - grid[0])))
+        k = np.fft.rfftfreq(nfft, grid[1] - grid[0])
+        kernels = np.exp(-2 * np.pi ** 2 * np.outer(self._sigma_levels ** 2, k ** 2))
+        ft = np.fft.rfft(fields, nfft)
+        return np.fft.irfft(ft[:, np.newaxis, :] * kernels, nfft)[..., :n]
+
+    # ===========================================================================
+    # Convolved MRP and derivatives
+    # ===========================================================================
+    @_cached
+    def _grid_like(self):
+        """
+        The MRP (and its derivatives) on the grid.
+        """
+        return SampleLike(self._grid, self.logHs, self.alpha, self.beta, self.lnA, self.log_mmin)
+
+    @_cached
+    def _f_grid(self):
+        """
+        The truncated MRP in log10 space (per unit log10 mass) on the grid.
+        """
+        g = self._grid_like
+        f = np.where(self._grid >= self.log_mmin, np.exp(g._lng) * g.m * ln10, 0)
+
+        # Trapezoidal weight at the truncation, so that the discrete convolution is second-order accurate.
+        f[np.argmin(np.abs(self._grid - self.log_mmin))] *= 0.5
+        return f
+
+    @_cached
+    def _conv(self):
+        """
+        The convolved MRP, and the convolution of the MRP times the jacobian and hessian of ln(g).
+        """
+        g = self._grid_like
+        jac = g._lng_jac
+        hess = g._getjac("_lng") + jac[:, np.newaxis] * jac[np.newaxis, :]
+        pairs = self._hess_pairs
+        fields = np.vstack(([self._f_grid], self._f_grid * jac, [self._f_grid * hess[i, j] for i, j in pairs]))
+        return self._convolve(fields)
+
+    @_cached
+    def _lnh(self):
+        """
+        Log of the convolved MRP (per unit log10 mass) at each object.
+        """
+        return self._interp(np.log(np.maximum(self._conv[0], np.finfo(float).tiny)))
+
+    @_cached
+    def _ratios(self):
+        """
+        The convolved derivative fields of :attr:`_conv`, divided by the convolved MRP (zero where it vanishes).
+        """
+        h = self._conv[0]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(h > 0, self._conv[1:] / h, 0)
+
+    @_cached
+    def _lnh_jac(self):
+        """
+        Jacobian of the log convolved MRP at each object.
+        """
+        return np.array([self._interp(c) for c in self._ratios[:4]])
+
+    @_cached
+    def _lnh_hess(self):
+        """
+        Hessian of the log convolved MRP at each object.
+        """
+        jac = self._lnh_jac
+        out = np.empty((4, 4, len(self.logm)))
+        for (i, j), c in zip(self._hess_pairs, self._ratios[4:]):
+            out[i, j] = out[j, i] = self._interp(c) - jac[i] * jac[j]
+        return out
+
+    # ===========================================================================
+    # Likelihood
+    # ===========================================================================
+    @property
+    def lnL(self):
+        """
+        Total log-likelihood with current model for the observed masses.
+        """
+        w = self._scaled_mass
+        return np.sum(w * (self._lnh - self.logm * ln10 - np.log(ln10))) - self._q_
+
+    @property
+    def jacobian(self):
+        """
+        The jacobian of the likelihood, with respect to `logHs`, `alpha`, `beta`, `lnA`.
+        """
+        return np.sum(self._scaled_mass * self._lnh_jac, axis=-1) - self._q_jac_
+
+    @property
+    def hessian(self):
+        """
+        The hessian of the likelihood, with respect to `logHs`, `alpha`, `beta`, `lnA`.
+        """
+        return np.sum(self._scaled_mass * self._lnh_hess, axis=-1) - self._q_hess_
+
+
+class BinnedPoissonLike(SampleLike):
+    r"""
+    A subclass of :class:`SampleLike` which adds the likelihood (and derivatives) of a model given
+    counts of masses in bins.
+
+    The number in each bin is Poisson-distributed, with expectation given by the difference of the
+    integral of the MRP above each of its edges (ie. a difference of :math:`\Gamma(z, x)` at the edges).
+    The likelihood is thus exact for histogrammed samples, and its cost scales with the number of bins
+    rather than of masses. The (parameter-independent) :math:`\ln n!` terms are omitted.
+
+    Parameters
+    ----------
+    logm : array_like
+        Increasing log10 masses of the bin edges. The first edge is the truncation mass.
+
+    counts : array_like
+        Number of masses in each bin, of length one less than `logm`.
+
+    logHs, alpha, beta, lnA : array_like
+        The parameters of the MRP.
+
+    rhom : float
+        Mass density of the universe. Only used if the normalisation is set to ``Arhom``.
+    """
+
+    def __init__(self, logm, counts, logHs, alpha, beta, lnA, rhom=0.3 * 2.7755e11):
+        logm = np.asarray(logm, dtype=float)
+        counts = np.asarray(counts, dtype=float)
+        if logm.ndim != 1 or len(logm) != len(counts) + 1:
+            raise ValueError("logm must be a vector of bin edges, one longer than counts")
+        if np.any(np.diff(logm) <= 0):
+            raise ValueError("logm must be strictly increasing")
+
+        super(BinnedPoissonLike, self).__init__(logm, logHs, alpha, beta, lnA, logm[0], rhom=rhom)
+        self.counts = counts
+
+    @_cached
+    def expected_counts(self):
+        """
+        The expected number of masses in each bin.
+        """
+        return -np.diff(self._q)
+
+    @_cached
+    def _W(self):
+        return np.sum(self.counts)
+
+    @_cached
+    def _Q(self):
+        return np.sum(self.expected_counts)
+
+    @_cached
+    def _mu_jac(self):
+        return -np.diff(self._q_jac, axis=-1)
+
+    @_cached
+    def _mu_hess(self):
+        return -np.diff(self._q_hess, axis=-1)
+
+    @property
+    def lnL(self):
+        """
+        Total log-likelihood of the counts with the current model.
+        """
+        mu = self.expected_counts
+        return np.sum(self.counts * np.log(mu) - mu)
+
+    @property
+    def jacobian(self):
+        """
+        The jacobian of the likelihood, with respect to `logHs`, `alpha`, `beta`, `lnA`.
+        """
+        return np.dot(self._mu_jac, self.counts / self.expected_counts - 1)
+
+    @property
+    def hessian(self):
+        """
+        The hessian of the likelihood, with respect to `logHs`, `alpha`, `beta`, `lnA`.
+        """
+        mu = self.expected_counts
+        jac = self._mu_jac
+        return np.dot(self._mu_hess, self.counts / mu - 1) - np.dot(jac * (self.counts / mu ** 2), jac.T)
+
+
 def expected_likelihood(theta, data_m, data_mf, kappa=None, V0=1, mmin=None):
     h,a,b,lnA = theta
 
@@ -944,7 +1890,7 @@ class CurveLike(SampleLike):
         # However, when things are constrained it gets a bit more messy.
 
         ## Data term first
-        errd = (self._delta_data_jac_sq + np.sum(self._delta_data_hess*self._delta_data, axis=-1))/self.sig_data**2
+        errd = (self._delta_data_jac_sq + self._lng_hess_from(self._lng_moments(self._delta_data)))/self.sig_data**2
 
 
         ## Rhomean term
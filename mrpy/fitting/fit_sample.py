@@ -9,11 +9,20 @@ definition of the likelihood involved in the fits within this module see
 This module also provides pre-defined prior functions, specifically, the ``normal_prior``.
 """
 
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+
 import numpy as np
 import scipy.optimize as opt
+from scipy.special import expit
 from scipy.stats import truncnorm
 
+import mrpy.base.special as sp
 import mrpy.extra.likelihoods as lk
+from mrpy._utils import load_array, string_types
 
 try:
     import emcee
@@ -21,62 +30,694 @@ except ImportError:
     print("Warning: emcee not installed, some routines won't work.")
 
 
-def _retarg(ll, jac, ret_jac):
-    if ret_jac:
-        return ll, jac
-    else:
+def _emcee3():
+    """
+    Whether the installed emcee has the version 3 API.
+    """
+    return int(emcee.__version__.split(".")[0]) >= 3
+
+
+def _nostore():
+    """
+    Keyword arguments preventing an :class:`emcee.EnsembleSampler` from storing the chain in memory.
+    """
+    return {"store": False} if _emcee3() else {"storechain": False}
+
+
+def _volume(V):
+    """
+    The log-volume (to be added to ``lnA``) and selection function (or None) corresponding to a volume `V`,
+    which is either a number or a :class:`~mrpy.extra.likelihoods.SelectionFunction`.
+    """
+    if isinstance(V, lk.SelectionFunction):
+        return 0.0, V
+    return np.log(V), None
+
+
+class SampleEvaluator(object):
+    """
+    Persistent evaluator of the log-likelihood (and derivatives) of MRP parameters given a suite of samples.
+
+    All data-dependent quantities are computed once, on construction, as a :class:`~mrpy.extra.likelihoods.SampleSummary`
+    per sample, so that each evaluation costs only what depends on the parameters.
+
+    Parameters
+    ----------
+    summaries : list of :class:`~mrpy.extra.likelihoods.SampleSummary`
+        A summary of each sample. See :meth:`from_samples` to create these from masses.
+
+    V : array_like
+        The volume of each sample, or a :class:`~mrpy.extra.likelihoods.SelectionFunction` giving the
+        volume as a function of mass.
+
+    bounds : list of 2-tuples
+        Bounds on each parameter, ``[logHs, alpha, beta, lnA]``. Outside these, the likelihood is ``-inf``.
+
+    prior_func : function, optional
+        Function of the parameters (and `prior_kwargs`) returning the log-prior and its jacobian (see :class:`SimFit`).
+        It may optionally return the hessian of the log-prior as a third value, otherwise it is taken to be zero.
+
+    prior_kwargs : dict, optional
+        Arguments sent to `prior_func`.
+
+    debug : int, optional
+        Set the level of info printed out throughout the function.
+
+    profile_lnA : bool, optional
+        Whether to profile the likelihood over `lnA`, in which case the parameters are ``[logHs, alpha, beta]``,
+        and `lnA` is set to its maximum-likelihood value within its bounds (see :meth:`lnA_hat`) for each. The
+        `prior_func` is then passed (and its jacobian and hessian refer to) only ``[logHs, alpha, beta]``, so
+        there is no prior on `lnA`. Where the maximum is within the bounds, this profile likelihood is equal
+        (up to a constant) to the likelihood marginalised over `lnA` with a uniform prior, so that it may also be
+        used for sampling.
+    """
+
+    def __init__(self, summaries, V, bounds, prior_func=None, prior_kwargs=None, debug=0, profile_lnA=False):
+        self.summaries = summaries
+        self.lnV, self.selections = zip(*[_volume(v) for v in np.atleast_1d(V)])
+        self.bounds = bounds
+        self.prior_func = prior_func
+        self.prior_kwargs = prior_kwargs or {}
+        self.debug = debug
+        self.profile_lnA = profile_lnA
+
+    @classmethod
+    def from_samples(cls, m, nm, mmin, V, bounds, **kwargs):
+        """
+        Create an evaluator from lists of masses, `m`, their weights `nm` and truncation masses `mmin`.
+        """
+        summaries = [lk.SampleSummary.from_masses(mi, nmi, mmini, beta_bounds=bounds[2])
+                     for mi, nmi, mmini in zip(m, nm, mmin)]
+        return cls(summaries, V, bounds, **kwargs)
+
+    def _models(self, p):
+        """
+        The likelihood object of each sample, at parameters `p`.
+        """
+        return [lk.SampleLikeSummary(summary, logHs=p[0], alpha=p[1], beta=p[2], lnA=p[3] + lnV,
+                                     selection=selection)
+                for summary, lnV, selection in zip(self.summaries, self.lnV, self.selections)]
+
+    def _lnL_many(self, thetas):
+        """
+        The log-likelihood (excluding prior) at each of the (in-bounds) parameters `thetas`.
+        """
+        h, a, b, lnA = thetas.T
+        return sum(summary.lnL(h, a, b, lnA + lnV, selection)
+                   for summary, lnV, selection in zip(self.summaries, self.lnV, self.selections))
+
+    @property
+    def W(self):
+        """
+        The total weight (ie. number of masses) of all samples.
+        """
+        return sum(summary.W for summary in self.summaries)
+
+    def _expected(self, thetas):
+        """
+        The expected number of masses in all samples at each of parameters `thetas` (with ``lnA=0``).
+        """
+        h, a, b = thetas.T[:3]
+        return sum(summary.expected_number(h, a, b, lnV, selection)
+                   for summary, lnV, selection in zip(self.summaries, self.lnV, self.selections))
+
+    def _lnA_max(self, thetas):
+        # The unbounded maximum-likelihood lnA, at which the expected number of masses equals W.
+        with np.errstate(divide="ignore"):
+            return np.log(self.W) - np.log(self._expected(np.atleast_2d(thetas)))
+
+    def lnA_hat(self, thetas):
+        """
+        The maximum-likelihood `lnA` (within its bounds), given each of the parameters `thetas`.
+
+        Parameters
+        ----------
+        thetas : array_like
+            Shape ``(K, 3)`` array of parameters, ``[logHs, alpha, beta]`` (any further columns are ignored).
+
+        Returns
+        -------
+        lnA : array
+            Length-``K`` array of `lnA`, at which the expected number of masses equals :attr:`W` (or the
+            nearest bound on `lnA`, since the likelihood is concave in `lnA`).
+        """
+        return np.clip(self._lnA_max(thetas), *self.bounds[3])
+
+    def sample_lnA(self, thetas, random_state=None):
+        """
+        Draw `lnA` from its posterior (with uniform prior), conditional on each of the parameters `thetas`.
+
+        Since the likelihood is that of a Poisson process, ``A`` is gamma-distributed, with shape :attr:`W`
+        and mean ``W/Q``, where ``Q`` is the expected number of masses for ``A=1``. The bounds on `lnA` are
+        ignored.
+
+        Parameters
+        ----------
+        thetas : array_like
+            Shape ``(K, 3)`` array of parameters, ``[logHs, alpha, beta]``.
+
+        random_state : :class:`numpy.random.RandomState`, optional
+            The source of random numbers.
+
+        Returns
+        -------
+        lnA : array
+            Length-``K`` array of draws of `lnA`.
+        """
+        random_state = random_state or np.random
+        lnA = self._lnA_max(thetas)
+        return lnA + np.log(random_state.gamma(self.W, size=len(lnA)) / self.W)
+
+    def _out_of_bounds(self, p):
+        # Some absolute bounds
+        if p[2] < 0 or p[0] < 0:
+            if self.debug > 0:
+                print("OUT OF BOUNDS: ", p)
+            return True
+
+        # Enforced bounds
+        for i, pp in enumerate(p):
+            if not self.bounds[i][0] <= pp <= self.bounds[i][1]:
+                if self.debug > 0:
+                    print("parameter out of bounds: ", p, self.bounds)
+                return True
+        return False
+
+    def evaluate(self, theta, want_jac=False, want_hess=False):
+        """
+        The log-likelihood at parameters `theta`, and optionally its jacobian and hessian.
+
+        Parameters
+        ----------
+        theta : array_like
+            The parameters, ``[logHs, alpha, beta, lnA]`` (or ``[logHs, alpha, beta]`` if `profile_lnA`).
+
+        want_jac, want_hess : bool, optional
+            Whether to compute the jacobian and hessian.
+
+        Returns
+        -------
+        ll : float
+            The log-likelihood (including prior).
+
+        jac : array or None
+            The jacobian, if `want_jac` is True.
+
+        hess : array or None
+            The hessian, if `want_hess` is True.
+        """
+        p = theta
+        if self._out_of_bounds(p):
+            return -np.inf, np.inf if want_jac else None, np.inf if want_hess else None
+        if self.profile_lnA:
+            p = np.append(p[:3], self.lnA_hat(p)[0])
+            if np.isnan(p[3]):
+                return -np.inf, np.inf if want_jac else None, np.inf if want_hess else None
+
+        # Likelihood
+        ll = 0
+        jac = np.zeros(len(p)) if want_jac else None
+        hess = np.zeros((len(p), len(p))) if want_hess else None
+        for _mod in self._models(p):
+            ll += _mod.lnL
+            if want_jac:
+                jac += _mod.jacobian
+            if want_hess:
+                hess += _mod.hessian
+
+        if self.profile_lnA:
+            # The derivative with respect to lnA vanishes at its maximum, unless that is on a bound.
+            if want_jac:
+                jac = jac[:3]
+            if want_hess:
+                hess = hess[:3, :3] if p[3] in self.bounds[3] else lk._profile_hessian(hess)
+
+        # Priors (on only the fitted parameters, if profile_lnA)
+        if self.prior_func is not None:
+            prior = self.prior_func(p[:3] if self.profile_lnA else p, **self.prior_kwargs)
+            ll += prior[0]
+            if want_jac:
+                jac += np.array(prior[1], dtype=float)
+            if want_hess and len(prior) > 2:
+                hess += np.array(prior[2], dtype=float)
+
+        if self.debug > 1:
+            print("pars, ll, jac: ", p, ll, jac)
+
+        if np.isnan(ll):
+            ll = -np.inf
+        return ll, jac, hess
+
+    def __call__(self, theta):
+        return self.evaluate(theta)[0]
+
+    def lnL_batch(self, thetas):
+        """
+        The log-likelihood (including prior) at each of many parameter vectors, in a single vectorised pass.
+
+        Parameters
+        ----------
+        thetas : array_like
+            Shape ``(K, 4)`` array of parameters, ``[logHs, alpha, beta, lnA]`` (or ``(K, 3)`` if `profile_lnA`).
+
+        Returns
+        -------
+        ll : array
+            Length-``K`` array of log-likelihoods, which are ``-inf`` out of bounds.
+        """
+        thetas = np.atleast_2d(thetas)
+        bounds = self.bounds[:thetas.shape[1]]
+        lower = np.array([b[0] for b in bounds])
+        upper = np.array([b[1] for b in bounds])
+        ok = np.all((thetas >= lower) & (thetas <= upper), axis=1) & (thetas[:, 0] >= 0) & (thetas[:, 2] >= 0)
+
+        ll = np.full(len(thetas), -np.inf)
+        if not np.any(ok):
+            return ll
+
+        if self.profile_lnA:
+            lnA = np.full(len(thetas), np.nan)
+            lnA[ok] = self.lnA_hat(thetas[ok])
+            ok &= ~np.isnan(lnA)
+            if not np.any(ok):
+                return ll
+            p = np.column_stack((thetas[ok, :3], lnA[ok]))
+        else:
+            p = thetas[ok]
+
+        lnl = self._lnL_many(p)
+        if self.prior_func is not None:
+            lnl = lnl + np.array([self.prior_func(pp, **self.prior_kwargs)[0] for pp in p[:, :thetas.shape[1]]])
+
+        ll[ok] = np.where(np.isnan(lnl), -np.inf, lnl)
+        if self.debug > 1:
+            print("pars, ll: ", thetas, ll)
         return ll
 
+    def objective(self, theta, jac=False):
+        """
+        The negative log-likelihood (and its jacobian, if `jac` is True), for minimization.
+        """
+        ll, j, _ = self.evaluate(theta, want_jac=jac)
+        if jac:
+            return -ll, -j
+        return -ll
 
-# Define the likelihood function
-def _lnl(p, m, nm, mmin, V,  bounds, prior_func=None, prior_kwargs=None,debug=0, ret_jac=False):
-    ## Note m,nm, mmin are always interpreted as being a list of arrays/scalars
 
-    if prior_kwargs is None:
-        prior_kwargs = {}
+class BinnedEvaluator(SampleEvaluator):
+    """
+    Persistent evaluator of the log-likelihood (and derivatives) of MRP parameters given a suite of histograms,
+    with the Poisson likelihood of :class:`~mrpy.extra.likelihoods.BinnedPoissonLike`.
 
-    # Some absolute bounds
-    if p[2] < 0 or p[0] < 0 :
-        if debug > 0:
-            print("OUT OF BOUNDS: ", p)
-        return _retarg(-np.inf, np.inf, ret_jac)
-
-    # Enforced bounds
-    for i,pp in enumerate(p):
-        if not bounds[i][0] <= pp <= bounds[i][1]:
-            if debug > 0:
-                print("parameter out of bounds: ", p, bounds)
-            return _retarg(-np.inf, np.inf, ret_jac)
-
-    # Priors
-    if prior_func is None:  # default uniform prior.
-        ll, jac = 0, np.zeros_like(p)
-    else:
-        ll, jac = prior_func(p,**prior_kwargs)
-
-    # Likelihood
-    for mi, nmi, mmini,Vi in zip(m, nm, mmin,V):
-        _mod = lk.SampleLikeWeights(weights=nmi, logm=np.log10(mi),
-                                    log_mmin=np.log10(mmini),
-                                    logHs=p[0], alpha=p[1], beta=p[2], lnA = p[3] + np.log(Vi))
-        ll += _mod.lnL
-        if ret_jac:
-            jac += _mod.jacobian
+    Parameters
+    ----------
+    counts : list of arrays
+        The number of masses in each bin, for each sample.
+
+    log_edges : list of arrays
+        The log10 bin edges of each sample.
+
+    V : array_like
+        The volume of each sample.
+
+    Other Parameters
+    ----------------
+    bounds, prior_func, prior_kwargs, debug, profile_lnA :
+        As for :class:`SampleEvaluator`.
+    """
+
+    def __init__(self, counts, log_edges, V, bounds, prior_func=None, prior_kwargs=None, debug=0,
+                 profile_lnA=False):
+        super(BinnedEvaluator, self).__init__(None, V, bounds, prior_func, prior_kwargs, debug, profile_lnA)
+        if any(selection is not None for selection in self.selections):
+            raise ValueError("Selection functions are not supported for binned likelihoods")
+        self.counts = counts
+        self.log_edges = log_edges
+
+    @property
+    def W(self):
+        return sum(np.sum(n) for n in self.counts)
+
+    def _expected(self, thetas):
+        h, a, b = thetas.T[:3]
+        Hs = 10 ** h
+        z = (a + 1) / b
+        return sum(np.exp(lnV) * Hs * (sp.gammainc_fast(z, (10 ** edges[0] / Hs) ** b) -
+                                       sp.gammainc_fast(z, (10 ** edges[-1] / Hs) ** b))
+                   for edges, lnV in zip(self.log_edges, self.lnV))
+
+    def _models(self, p):
+        return [lk.BinnedPoissonLike(edges, n, logHs=p[0], alpha=p[1], beta=p[2], lnA=p[3] + lnV)
+                for n, edges, lnV in zip(self.counts, self.log_edges, self.lnV)]
+
+    def _lnL_many(self, thetas):
+        return np.array([sum(mod.lnL for mod in self._models(p)) for p in thetas])
+
+
+def _newton_step(jac, hess):
+    """
+    The Newton step (towards the maximum) for a log-likelihood with jacobian `jac` and hessian `hess`.
+
+    Where the hessian is not negative-definite, the signs of its positive eigenvalues are flipped, so that the
+    step is always uphill.
+    """
+    h = -np.asarray(hess)
+    try:
+        np.linalg.cholesky(h)
+    except np.linalg.LinAlgError:
+        w, v = np.linalg.eigh(h)
+        w = np.maximum(np.abs(w), 1e-8 * np.abs(w).max())
+        return np.dot(v, np.dot(v.T, jac) / w)
+    return np.linalg.solve(h, jac)
+
+
+def _newton(evaluator, x0, bounds, tol=1e-6, maxiter=100, disp=False):
+    """
+    Maximize the likelihood of `evaluator` by Newton's method with a backtracking line search, projecting
+    steps onto the `bounds`.
+
+    Convergence is reached when the expected increase of the log-likelihood from a further Newton step
+    (half the Newton decrement) is less than `tol`. Parameters on a bound, at which the likelihood increases
+    outwards, are held fixed.
+    """
+    lower, upper = np.array(bounds, dtype=float).T
+    x = np.clip(np.asarray(x0, dtype=float), lower, upper)
+    ll, jac, hess = evaluator.evaluate(x, want_jac=True, want_hess=True)
+    if not np.isfinite(ll):
+        return opt.OptimizeResult(x=x, fun=np.inf, jac=np.full(len(x), np.nan), hess=np.full((len(x),) * 2, np.nan),
+                                  nit=0, nfev=1, njev=1, nhev=1, success=False,
+                                  message="The likelihood is not finite at the initial guess.")
+    nfev, success, message = 1, False, "Maximum number of iterations has been exceeded."
+
+    for nit in range(1, maxiter + 1):
+        free = ~(((x <= lower) & (jac < 0)) | ((x >= upper) & (jac > 0)))
+        step = np.zeros_like(x)
+        step[free] = _newton_step(jac[free], hess[np.ix_(free, free)])
+
+        if np.dot(jac, step) / 2 < tol:
+            success, message = True, "Optimization terminated successfully."
+            nit -= 1
+            break
+
+        # Backtrack until the likelihood sufficiently increases.
+        t = 1.0
+        while True:
+            x_new = np.clip(x + t * step, lower, upper)
+            ll_new, jac_new, hess_new = evaluator.evaluate(x_new, want_jac=True, want_hess=True)
+            nfev += 1
+            if ll_new >= ll + 1e-4 * np.dot(jac, x_new - x) or t < 1e-10:
+                break
+            t /= 2
+
+        if not ll_new > ll:
+            message = "Line search failed to increase the likelihood."
+            break
+        x, ll, jac, hess = x_new, ll_new, jac_new, hess_new
+
+    if disp:
+        print(message)
+    return opt.OptimizeResult(x=x, fun=-ll, jac=-jac, hess=-hess, nit=nit, nfev=nfev, njev=nfev, nhev=nfev,
+                              success=success, message=message)
+
+
+class _TransformedObjective(object):
+    """
+    The negative log-likelihood of an evaluator (with its jacobian and hessian), as a function of unbounded
+    variables, ``u``, which map onto the bounded parameters as ``lower + (upper - lower) * expit(u)``.
+
+    The likelihood and its derivatives are computed together, and cached for the most recent ``u``, since
+    optimizers request them separately.
+    """
+
+    def __init__(self, evaluator, bounds):
+        self.evaluator = evaluator
+        self.lower, self.upper = np.array(bounds, dtype=float).T
+        self._last = None
+
+    def to_u(self, theta):
+        f = np.clip((np.asarray(theta) - self.lower) / (self.upper - self.lower), 1e-10, 1 - 1e-10)
+        return np.log(f / (1 - f))
+
+    def to_theta(self, u):
+        return self.lower + (self.upper - self.lower) * expit(u)
+
+    def _evaluate(self, u):
+        if self._last is None or np.any(self._last[0] != u):
+            s = expit(u)
+            d1 = (self.upper - self.lower) * s * (1 - s)  # first and second derivatives of theta(u)
+            d2 = d1 * (1 - 2 * s)
+            ll, jac, hess = self.evaluator.evaluate(self.to_theta(u), want_jac=True, want_hess=True)
+            self._last = (np.array(u), -ll, -jac * d1, -(hess * np.outer(d1, d1) + np.diag(jac * d2)))
+        return self._last[1:]
+
+    def fun(self, u):
+        return self._evaluate(u)[0]
+
+    def jac(self, u):
+        return self._evaluate(u)[1]
+
+    def hess(self, u):
+        return self._evaluate(u)[2]
+
+
+class _DualAveraging(object):
+    """
+    Dual-averaging adaptation of the HMC step size towards a target acceptance probability
+    (Hoffman & Gelman, 2014, Algorithm 5).
+    """
+
+    def __init__(self, step_size, target, gamma=0.05, t0=10.0, kappa=0.75):
+        self.mu = np.log(10 * step_size)
+        self.target, self.gamma, self.t0, self.kappa = target, gamma, t0, kappa
+        self.t, self.h, self.log_step, self.log_step_bar = 0, 0.0, np.log(step_size), 0.0
+
+    @property
+    def step_size(self):
+        return np.exp(self.log_step)
+
+    @property
+    def final_step_size(self):
+        return np.exp(self.log_step_bar)
+
+    def update(self, accept_prob):
+        self.t += 1
+        w = 1.0 / (self.t + self.t0)
+        self.h = (1 - w) * self.h + w * (self.target - accept_prob)
+        self.log_step = self.mu - np.sqrt(self.t) / self.gamma * self.h
+        w = self.t ** -self.kappa
+        self.log_step_bar = w * self.log_step + (1 - w) * self.log_step_bar
+
+
+def _hmc_scale(hess, dense=True):
+    """
+    Cholesky factor, ``L``, of the covariance ``-inv(hess)``, or the square root of its diagonal if not `dense`.
+    Falls back on the diagonal of the hessian if it is not negative-definite.
+    """
+    try:
+        L = np.linalg.cholesky(np.linalg.inv(-hess))
+    except np.linalg.LinAlgError:
+        return np.diag(1 / np.sqrt(np.abs(np.diag(hess))))
+    return L if dense else np.diag(np.sqrt(np.sum(L ** 2, axis=1)))
+
+
+def _hmc_transition(evaluator, x, ll, jac, L, step_size, n_steps, random_state):
+    """
+    A single HMC transition from `x` (with log-likelihood `ll` and jacobian `jac`), integrating `n_steps`
+    leapfrog steps in whitened coordinates ``z``, where ``x = x0 + L.z``, with unit mass.
+
+    Returns the new position, log-likelihood and jacobian, the acceptance probability, whether the
+    trajectory diverged, and the number of likelihood evaluations made (fewer than `n_steps` if it diverged).
+    """
+    r0 = random_state.normal(size=len(x))
+    g = np.dot(L.T, jac)
+    z, r = np.zeros(len(x)), r0 + step_size * g / 2
+    divergent, nfev = False, 0
+
+    for i in range(n_steps):
+        z = z + step_size * r
+        ll_new, jac_new, _ = evaluator.evaluate(x + np.dot(L, z), want_jac=True)
+        nfev += 1
+        if not np.isfinite(ll_new):
+            divergent = True
+            break
+        g = np.dot(L.T, jac_new)
+        r = r + step_size * g * (1 if i < n_steps - 1 else 0.5)
+
+    dH = (ll_new - np.dot(r, r) / 2) - (ll - np.dot(r0, r0) / 2) if not divergent else -np.inf
+    if dH < -1000:
+        divergent = True
+    accept_prob = min(1.0, np.exp(dH)) if not np.isnan(dH) else 0.0
+
+    if random_state.uniform() < accept_prob:
+        return x + np.dot(L, z), ll_new, jac_new, accept_prob, divergent, nfev
+    return x, ll, jac, accept_prob, divergent, nfev
+
+
+def _gpdfit(x):
+    """
+    Fit a generalized Pareto distribution to the (ascending, positive) exceedances `x`, by the method of Zhang &
+    Stephens (2009), with the weakly-informative prior on the shape of Vehtari et al. (2015). Returns the shape
+    and scale.
+    """
+    n = len(x)
+    m = 30 + int(np.sqrt(n))
+    b = 1 - np.sqrt(m / (np.arange(1, m + 1) - 0.5))
+    b = b / (3 * x[int(n / 4.0 + 0.5) - 1]) + 1 / x[-1]
+
+    k = np.log1p(-b[:, np.newaxis] * x).mean(axis=1)
+    prof = n * (np.log(-b / k) - k - 1)
+    with np.errstate(over="ignore"):
+        w = 1 / np.exp(prof - prof[:, np.newaxis]).sum(axis=1)
+    b = np.sum(b * w) / np.sum(w)
+
+    k = np.log1p(-b * x).mean()
+    sigma = -k / b
+    return (n * k + 5.0) / (n + 10), sigma
+
+
+def _psis(log_w):
+    """
+    Pareto-smoothed importance sampling (Vehtari et al., 2015): replace the largest of the importance weights
+    by the expected order statistics of a generalized Pareto distribution fit to them. Returns the normalised
+    smoothed log-weights and the estimated Pareto shape, ``k``.
+    """
+    lw = np.asarray(log_w, dtype=float) - np.max(log_w)
+    n = len(lw)
+    m = int(min(0.2 * n, 3 * np.sqrt(n)))
+    order = np.argsort(lw)
+    tail = order[-m:]
+    cut = np.exp(lw[order[-m - 1]])
+    x = np.exp(lw[tail]) - cut
+
+    k = np.inf
+    if m >= 5 and x[0] > 0:
+        k, sigma = _gpdfit(x)
+        p = (np.arange(1, m + 1) - 0.5) / m
+        q = sigma * np.expm1(-k * np.log1p(-p)) / k if abs(k) > 1e-10 else -sigma * np.log1p(-p)
+        lw[tail] = np.minimum(np.log(q + cut), 0)
+
+    lw -= np.log(np.sum(np.exp(lw)))
+    return lw, k
+
+
+class _BatchMap(object):
+    """
+    Stand-in for the ``pool`` of an :class:`emcee.EnsembleSampler` (for ``emcee<3``, which lacks
+    the ``vectorize`` option), whose ``map`` evaluates all walkers with a single call to
+    :meth:`SampleEvaluator.lnL_batch`.
+    """
+
+    def __init__(self, evaluator):
+        self.evaluator = evaluator
+
+    def map(self, func, positions):
+        return list(self.evaluator.lnL_batch(np.array(positions)))
+
+
+def _state_file(chainfile):
+    return chainfile + ".state.npz"
+
+
+def _derived_random_state(rstate):
+    """
+    A new :class:`numpy.random.RandomState`, seeded from (without advancing) the generator with state `rstate`.
+    """
+    rs = np.random.RandomState()
+    rs.set_state(rstate)
+    return np.random.RandomState(rs.randint(2 ** 31))
+
+
+def _save_state(chainfile, pos, lnprob, rstate, lnA_rstate, nsteps, warmup, iterations):
+    """
+    Atomically write the state of a sampler run (including that of the generator for `lnA`) to the state file
+    of `chainfile`.
+    """
+    path = _state_file(chainfile)
+    tmp = path + ".tmp.npz"
+    arrays = {}
+    for prefix, rs in [("rs", rstate), ("lnA_rs", lnA_rstate)]:
+        arrays.update({prefix + "_keys": rs[1], prefix + "_pos": rs[2], prefix + "_has_gauss": rs[3],
+                       prefix + "_cached_gaussian": rs[4]})
+    np.savez(tmp, pos=pos, lnprob=lnprob, nsteps=nsteps, warmup=warmup, iterations=iterations, **arrays)
+    os.rename(tmp, path)
+
+
+def _load_state(chainfile):
+    """
+    Read the state of a sampler run from the state file of `chainfile`.
+    """
+    with np.load(_state_file(chainfile)) as f:
+        state = {k: f[k] for k in f.files}
+    for prefix, key in [("rs", "rstate"), ("lnA_rs", "lnA_rstate")]:
+        state[key] = ("MT19937", state.pop(prefix + "_keys"), int(state.pop(prefix + "_pos")),
+                      int(state.pop(prefix + "_has_gauss")), float(state.pop(prefix + "_cached_gaussian")))
+    for k in ["nsteps", "warmup", "iterations"]:
+        state[k] = int(state[k])
+    return state
+
+
+def load_chain(chainfile):
+    """
+    Read a chain written by :meth:`SimFit.run_mcmc`, as a read-only memory-map.
+
+    Parameters
+    ----------
+    chainfile : str
+        The ``chainfile`` passed to :meth:`SimFit.run_mcmc`. Its state file, ``chainfile + ".state.npz"``,
+        must also exist.
+
+    Returns
+    -------
+    chain : array
+        Shape ``(iterations, nchains, 5)`` array. The last axis holds ``[logHs, alpha, beta, lnA, lnprob]``.
+        Only steps up to the last checkpoint are included.
+    """
+    state = _load_state(chainfile)
+    nchains = len(state["pos"])
+    n = max(state["nsteps"] - state["warmup"], 0)
+    if n == 0:
+        return np.empty((0, nchains, 5))
+    return np.memmap(chainfile, dtype=np.float64, mode="r", shape=(n, nchains, 5))
+
+
+def integrated_time(chain, c=5.0):
+    """
+    Estimate the integrated autocorrelation time of each parameter of an ensemble of MCMC walkers.
+
+    The autocorrelation function of each walker is computed by FFT and averaged over walkers, and summed up to
+    the smallest lag ``M`` for which ``M >= c*tau(M)`` (the automatic windowing of Sokal, 1989).
+
+    Parameters
+    ----------
+    chain : array
+        Shape ``(nsteps, nwalkers)`` or ``(nsteps, nwalkers, ndim)`` chain.
+
+    c : float, optional
+        Window constant. Larger values give less biased, but noisier estimates.
+
+    Returns
+    -------
+    tau : float or array
+        The autocorrelation time (in steps) of each parameter.
+    """
+    x = np.asarray(chain, dtype=float)
+    scalar = x.ndim == 2
+    if scalar:
+        x = x[..., np.newaxis]
+    n = x.shape[0]
 
-    if debug > 1:
-        print("pars, ll, jac: ", p, ll, jac)
+    f = x - x.mean(axis=0)
+    m = 2 ** int(np.ceil(np.log2(2 * n)))
+    ft = np.fft.rfft(f, n=m, axis=0)
+    acf = np.fft.irfft(ft * np.conjugate(ft), n=m, axis=0)[:n].mean(axis=1)
+    acf /= acf[0]
 
-    if np.isnan(ll):
-        return _retarg(-np.inf, jac, ret_jac)
-    else:
-        return _retarg(ll, jac, ret_jac)
+    taus = 2 * np.cumsum(acf, axis=0) - 1
+    window = np.arange(n)[:, np.newaxis] >= c * taus
+    ind = np.where(window.any(axis=0), window.argmax(axis=0), n - 1)
+    tau = taus[ind, np.arange(taus.shape[1])]
+    return tau[0] if scalar else tau
 
-def _objfunc(*args):
-    out = _lnl(*args)
-    if np.isscalar(out):
-        return -out
-    else:
-        return -out[0], -out[1]
 
 def normal_prior(p,mean,sd):
     """
@@ -122,20 +763,23 @@ class SimFit(object):
     m : array or list of arrays
         Masses. Either an array or a list of arrays, each of which is a sample *to be
         analysed simultaneously*. In the latter case the samples should have the same
-        underlying distribution, but may have differing truncation scales.
+        underlying distribution, but may have differing truncation scales. Each array
+        may be a :class:`numpy.memmap` or the path to a ``.npy`` file (which is memory-mapped),
+        in which case it is processed in blocks, and never read into memory in full.
 
     nm : array, optional
         Specifies the number of occurrences of each variate in `m` (which should then
         ideally be unique). If not passed, each variate is assumed to occur once. This
         is useful for speeding up fits on quantized simulations. If `m` is a list of
-        arrays, this should be also.
+        arrays, this should be also. Like `m`, these may be memory-mapped.
 
     mmin : array_like, optional
         The truncation mass of the sample. By default takes the lowest value of `m`.
         If `m` is a list of arrays, this should be a list.
 
     V : array, optional
-        The volume of each subsample
+        The volume of each subsample. Each may instead be a :class:`~mrpy.extra.likelihoods.SelectionFunction`,
+        giving the volume as a function of mass.
 
     hs_bounds, alpha_bounds, beta_bounds : 2-tuple
         2-tuples specifying minimum and maximum values for each bound.
@@ -153,6 +797,14 @@ class SimFit(object):
     prior_kwargs : dict
         Arguments sent to the `prior_func`.
 
+    profile_lnA : bool, optional
+        Whether to fit only the shape parameters, ``[logHs, alpha, beta]``, with `lnA` set to its
+        maximum-likelihood value (within `lnA_bounds`) given them (see :meth:`SampleEvaluator.lnA_hat`). This
+        reduces the dimension of the fit, and removes the need for a good initial guess of `lnA`. In
+        :meth:`run_mcmc`, `lnA` is then marginalised over (with a uniform prior), and its posterior samples are
+        drawn afterwards, conditional on the samples of the other parameters. The `prior_func` is then passed
+        only ``[logHs, alpha, beta]``.
+
     Notes
     -----
     Use as stringent bounds as possible, since the algorithm explores the
@@ -162,34 +814,106 @@ class SimFit(object):
     def __init__(self, m, nm=None, mmin=None,V=1.0,
                  hs_bounds=(10, 16), alpha_bounds=(-1.99, -1.3),
                  beta_bounds=(0.1, 2.0), lnA_bounds = (-40,-10),
-                 prior_func=None,prior_kwargs=None):
-
-        if prior_kwargs is None:
-            prior_kwargs = {}
+                 prior_func=None,prior_kwargs=None, profile_lnA=False):
 
         self._determine_suite(m, nm, mmin,V)
 
-        # Make sure all masses are above mmin
+        # Make sure all masses are above mmin (memory-mapped samples are instead masked block by block).
         for i, (m, mmin) in enumerate(zip(self.m, self.mmin)):
-            self.m[i] = m[m >= mmin]
-            self.nm[i] = self.nm[i][m >= mmin]
+            if not isinstance(m, np.memmap):
+                self.m[i] = m[m >= mmin]
+                self.nm[i] = self.nm[i][m >= mmin]
+
+        self._set_options(hs_bounds, alpha_bounds, beta_bounds, lnA_bounds, prior_func, prior_kwargs, profile_lnA)
 
+    def _set_options(self, hs_bounds, alpha_bounds, beta_bounds, lnA_bounds, prior_func, prior_kwargs,
+                     profile_lnA):
+        # Data-independent setup, shared by subclasses.
         self.hs_bounds = hs_bounds
         self.alpha_bounds = alpha_bounds
         self.beta_bounds = beta_bounds
         self.lnA_bounds = lnA_bounds
         self.prior_func = prior_func
-        self.prior_kwargs = prior_kwargs
+        self.prior_kwargs = prior_kwargs or {}
+        self.profile_lnA = profile_lnA
+
+    @property
+    def _bounds(self):
+        return [self.hs_bounds, self.alpha_bounds, self.beta_bounds, self.lnA_bounds]
+
+    def evaluator(self, debug=0):
+        """
+        A :class:`SampleEvaluator` for the samples, with the current bounds and priors.
+
+        The data-dependent pre-computations are performed only on the first call, and shared by all evaluators.
+
+        Parameters
+        ----------
+        debug : int, optional
+            Set the level of info printed out throughout the function.
+        """
+        if not hasattr(self, "_summaries"):
+            self._summaries = SampleEvaluator.from_samples(self.m, self.nm, self.mmin, self.V, self._bounds).summaries
+        return SampleEvaluator(self._summaries, self.V, self._bounds, self.prior_func, self.prior_kwargs, debug,
+                               self.profile_lnA)
+
+    @property
+    def logm(self):
+        """
+        Log10 masses of each sample.
+
+        Each access computes these in full, as in-memory arrays, even for memory-mapped samples (which the
+        likelihood evaluations read only in blocks). For very large catalogues, prefer :attr:`m`.
+        """
+        return [np.log10(x) for x in self.m]
+
+    @staticmethod
+    def _default_weights(m):
+        # Unit weights, which for memory-mapped samples are implied (None), rather than stored.
+        return None if isinstance(m, np.memmap) else np.ones_like(m)
+
+    def append(self, m, nm=None, dataset=0):
+        """
+        Add masses to one of the samples, for instance as a halo catalogue grows.
+
+        The likelihood state (see :meth:`evaluator`) is updated in a time proportional to the number of
+        new masses, without re-reading the existing samples. The attributes `m` and `nm` continue to refer
+        only to the masses passed on construction.
 
+        Parameters
+        ----------
+        m : array
+            New masses.
+
+        nm : array, optional
+            The number of occurrences of each of the new masses. By default, each occurs once.
+
+        dataset : int, optional
+            The index of the sample to which the masses belong.
+        """
+        self.evaluator()
+        self._summaries[dataset].append(np.log10(m), nm)
+        self._appended = getattr(self, "_appended", set()) | {dataset}
+
+        # Any previous optimization no longer applies.
+        if hasattr(self, "downhill_res"):
+            del self.downhill_res
 
     def _determine_suite(self, m, nm, mmin,V):
         ## Determine whether there is a suite of simulations.
+        if isinstance(m, (list, tuple)):
+            m = [load_array(x) for x in m]
+            if nm is not None:
+                nm = [load_array(x) for x in nm]
+        else:
+            m = load_array(m)
+            nm = load_array(nm)
+
         if np.isscalar(m[0]):
             self.m = [m]
-            self.logm = [np.log10(m)]
 
             if nm is None:
-                self.nm = [np.ones_like(m)]
+                self.nm = [self._default_weights(m)]
             else:
                 self.nm = [nm]
 
@@ -204,10 +928,9 @@ class SimFit(object):
 
         else:
             self.m = m
-            self.logm = [np.log10(x) for x in self.m ]
 
             if nm is None:
-                self.nm = [np.ones_like(x) for x in m]
+                self.nm = [self._default_weights(x) for x in m]
             else:
                 self.nm = nm
 
@@ -218,21 +941,23 @@ class SimFit(object):
 
             self.log_mmin = [np.log10(x.min()) for x in self.mmin]
 
-            if np.isscalar(V):
+            if np.isscalar(V) or isinstance(V, lk.SelectionFunction):
                 print("WARNING: V is a scalar, but there are multiple datasets")
                 self.V = [V]*len(m)
             else:
                 self.V = V
 
     def run_downhill(self, hs0=14.5, alpha0=-1.9, beta0=0.8, lnA0=-40.0,
-                     debug=0, jac=True, **minimize_kw):
+                     debug=0, jac=True, method=None, **minimize_kw):
         """
         Downhill-gradient optimization.
 
         Parameters
         ----------
         hs0, alpha0, beta0, lnA0: float, optional
-            Initial guess for each of the MRP parameters.
+            Initial guess for each of the MRP parameters. `lnA0` is ignored if `profile_lnA`, and for the
+            ``"newton"`` and ``"trust-exact"`` methods, which instead start from the value of `lnA` maximising
+            the likelihood at the initial guess of the other parameters.
 
         debug : int, optional
             Set the level of info printed out throughout the function. Highest current
@@ -241,6 +966,20 @@ class SimFit(object):
         jac : bool, optional
             Whether to use analytic jacobian (usually a good idea)
 
+        method : str, optional
+            The method of :func:`scipy.optimize.minimize`, or ``"newton"``. The latter, and ``"trust-exact"``,
+            use the analytic hessian as well as jacobian, and usually converge in far fewer iterations (for
+            these, `jac` is ignored). ``"newton"`` is Newton's method with a line search, with steps projected
+            onto the bounds. For ``"trust-exact"``, the bounds are enforced by optimizing over unbounded
+            variables, which are mapped onto the bounds by a logistic function. ``"newton"`` stops when a
+            further Newton step would increase the log-likelihood by less than ``tol`` (default ``1e-6``),
+            which may be passed in `minimize_kw`; its only other supported arguments are the ``options``
+            ``maxiter`` and ``disp``. ``"trust-exact"`` stops by the criteria of :func:`scipy.optimize.minimize`
+            (eg. its ``gtol`` option, on the gradient in the unbounded variables), and `tol` is not passed on.
+            Instead, a run which scipy deems unconverged is accepted if a Newton step from its solution would
+            increase the log-likelihood by less than `tol`. For both, ``jac`` and ``hess`` in the result are
+            the derivatives of the negative log-likelihood with respect to the parameters.
+
         minimize_kw : dict
             Any other parameters to :func:`scipy.optimize.minimize`.
 
@@ -251,14 +990,17 @@ class SimFit(object):
             (see scipy documentation).
             Important attributes are: ``x`` the solution array, ``success`` a Boolean flag
             indicating if the optimizer exited successfully and ``message`` which describes
-            the cause of the termination.
+            the cause of the termination. The number of iterations and evaluations of the likelihood
+            (and derivatives) are ``nit``, ``nfev``, ``njev`` and ``nhev``.
 
-            The parameters are ordered by `logHs`, `alpha`, `beta`, `[lnA]`.
+            The parameters are ordered by `logHs`, `alpha`, `beta`, `[lnA]`. If `profile_lnA`,
+            ``x`` contains only the first three, and the profiled `lnA` is given as ``lnA``.
 
         downhill_obj : :class:`mrpy.likelihoods.PerObjLikeWeights` object
             An object containing the solution parameters and methods to access
             relevant quantities, such as the mass function, or jacobian and
-            hessian at the solution.
+            hessian at the solution. For memory-mapped samples, or those with masses added by
+            :meth:`append`, this is instead a :class:`mrpy.extra.likelihoods.SampleLikeSummary`.
 
         Examples
         --------
@@ -286,21 +1028,64 @@ class SimFit(object):
         >>> print obj.stats.mean, r.mean()
         """
         p0 =[hs0, alpha0, beta0,lnA0]
-        bounds = [self.hs_bounds, self.alpha_bounds, self.beta_bounds,self.lnA_bounds]
-
-        self.downhill_res = opt.minimize(_objfunc, p0, args=(self.m, self.nm, self.mmin, self.V, bounds,
-                                                             self.prior_func,self.prior_kwargs,
-                                                             debug, jac),
-                                         bounds=bounds, jac=jac, **minimize_kw)
-
-        self.downhill_obj = [lk.SampleLikeWeights(logm=np.log10(mi), weights=nmi,
-                                                  logHs=self.downhill_res.x[0], alpha=self.downhill_res.x[1],
-                                                  beta=self.downhill_res.x[2], lnA = self.downhill_res.x[3] - np.log(V),
-                                                  log_mmin=np.log10(mmini)) for mi, nmi, mmini,V in
-                             zip(self.m, self.nm, self.mmin,self.V)]
+        bounds = self._bounds
+        evaluator = self.evaluator(debug)
+        if self.profile_lnA:
+            p0, bounds = p0[:3], bounds[:3]
+
+        if method in ("newton", "trust-exact") and not self.profile_lnA:
+            # The likelihood is concave in lnA, with a closed-form maximum, which is a much better starting point.
+            p0[3] = evaluator.lnA_hat(p0)[0]
+
+        if method == "newton":
+            options = dict(minimize_kw.pop("options", {}))
+            unsupported = set(minimize_kw) - {"tol"} | set(options) - {"maxiter", "disp"}
+            if unsupported:
+                raise ValueError("Unsupported arguments for method='newton': %s" % ", ".join(sorted(unsupported)))
+            self.downhill_res = _newton(evaluator, p0, bounds, tol=minimize_kw.get("tol", 1e-6), **options)
+        elif method == "trust-exact":
+            tol = minimize_kw.pop("tol", 1e-6)
+            obj = _TransformedObjective(evaluator, bounds)
+            res = opt.minimize(obj.fun, obj.to_u(p0), jac=obj.jac, hess=obj.hess, method=method, **minimize_kw)
+            res.x = obj.to_theta(res.x)
+            ll, jac, hess = evaluator.evaluate(res.x, want_jac=True, want_hess=True)
+            res.jac, res.hess = -jac, -hess
+
+            # Near the maximum, the likelihood may not be resolved well enough for scipy to deem convergence.
+            if not res.success and np.dot(jac, _newton_step(jac, hess)) / 2 < tol:
+                res.success, res.message = True, "Optimization terminated successfully."
+            self.downhill_res = res
+        else:
+            self.downhill_res = opt.minimize(evaluator.objective, p0, args=(jac,), method=method,
+                                             bounds=bounds, jac=jac, **minimize_kw)
 
+        if debug > 0:
+            print("Optimization finished after %s iterations (%s evaluations): %s" % (
+                self.downhill_res.get("nit"), self.downhill_res.get("nfev"), self.downhill_res.message))
+
+        x = self.downhill_res.x
+        if self.profile_lnA:
+            self.downhill_res.lnA = evaluator.lnA_hat(x)[0]
+            x = np.append(x, self.downhill_res.lnA)
+        self.downhill_obj = self._downhill_obj(x)
         return self.downhill_res, self.downhill_obj
 
+    def _downhill_obj(self, x):
+        # The likelihood object of each sample at the solution, x.
+        downhill_obj = []
+        appended = getattr(self, "_appended", set())
+        for i, (mi, nmi, mmini, V, summary) in enumerate(zip(self.m, self.nm, self.mmin, self.V, self._summaries)):
+            lnV, selection = _volume(V)
+            if isinstance(mi, np.memmap) or i in appended:
+                # Don't read memory-mapped samples into memory, and include appended masses.
+                obj = lk.SampleLikeSummary(summary, logHs=x[0], alpha=x[1], beta=x[2], lnA=x[3] + lnV,
+                                           selection=selection)
+            else:
+                obj = lk.SampleLikeWeights(logm=np.log10(mi), weights=nmi, logHs=x[0], alpha=x[1], beta=x[2],
+                                           lnA=x[3] + lnV, log_mmin=np.log10(mmini), selection=selection)
+            downhill_obj.append(obj)
+        return downhill_obj
+
     # =========================================================================================
     # EMCEE BASED ROUTINES
     # =========================================================================================
@@ -329,8 +1114,8 @@ class SimFit(object):
 
     def run_mcmc(self, nchains=50, warmup=1000, iterations=1000,
                  hs0=14.5, alpha0=-1.9, beta0=0.8, lnA0=-26.0, logm0 = None, debug=0,
-                 opt_init=False, opt_kw=None, chainfile="chain.dat", save_latent = True,
-                 **kwargs):
+                 opt_init=False, opt_kw=None, chainfile=None, save_latent = True,
+                 vectorize=True, resume=False, checkpoint=100, target_ess=None, **kwargs):
         """
         Per-object MCMC fit for masses `m`, using the `emcee` package.
 
@@ -352,8 +1137,8 @@ class SimFit(object):
         iterations : int, optional
             Number of iterations to keep in the chain.
 
-        hs0, alpha0, beta0: float, optional
-            Initial guess for each of the MRP parameters.
+        hs0, alpha0, beta0, lnA0: float, optional
+            Initial guess for each of the MRP parameters. `lnA0` is ignored if `profile_lnA`.
 
         debug : int, optional
             Set the level of info printed out throughout the function. Highest current
@@ -366,13 +1151,47 @@ class SimFit(object):
         opt_kw : dict, optional
             Any arguments to pass to the downhill run.
 
+        chainfile : str, optional
+            If given, the chain is not stored in memory, but appended to this (raw binary) file every
+            `checkpoint` steps, along with the state of the sampler (walker positions and random state) in
+            ``chainfile + ".state.npz"``. Read the chain with :func:`load_chain`.
+
+        vectorize : bool, optional
+            Whether to evaluate the likelihood of all walkers at once with
+            :meth:`SampleEvaluator.lnL_batch`, rather than one at a time. Ignored if a
+            ``pool`` is passed to the sampler.
+
+        resume : bool, optional
+            If True and the state file of `chainfile` exists, continue the run from its last checkpoint
+            (ignoring the initial guesses), until `warmup` and `iterations` steps are complete in total. The
+            random states of the sampler and of the draws of `lnA` are restored, so that the chain is the same
+            as that of an uninterrupted run.
+
+        checkpoint : int, optional
+            Number of steps between writes to `chainfile`, or between estimates of the autocorrelation time
+            if `target_ess` is given.
+
+        target_ess : int, optional
+            If given, run adaptively (with the chain in memory), with `warmup` and `iterations` as the maximum
+            numbers of steps. Warmup ends once it is at least ten autocorrelation times long, and the estimate
+            of the autocorrelation time has changed by less than 5% since the last check. Sampling ends once
+            the effective sample size (over all walkers) of each parameter reaches `target_ess`.
+
+        logm0, save_latent :
+            Unused, as the model has no latent masses.
+
         kwargs :
             Any other parameters to :class:`emcee.EnsembleSampler`.
 
         Returns
         -------
         mcmc_res : :class:`emcee.EnsembleSampler` object
-            This object contains the stored chains, and other attributes.
+            This object contains the stored chains, and other attributes. If `profile_lnA`, the chains
+            contain only ``[logHs, alpha, beta]``, and samples of `lnA` for each step are stored in
+            :attr:`mcmc_lnA` (with the shape of the chain, but for the last axis). If `chainfile` is given,
+            the chain is instead stored in the file, and also as a memory-map in :attr:`mcmc_chain`. Unless
+            `chainfile` is given, the number of steps, autocorrelation times, effective sample sizes and
+            effective samples per second of the kept chain are stored in the dict :attr:`mcmc_diagnostics`.
 
         Examples
         --------
@@ -407,20 +1226,370 @@ class SimFit(object):
             else:
                 print("WARNING: Optimization failed. Falling back on given initial parameters.")
 
+        if self.profile_lnA:
+            guess, bounds = guess[:3], bounds[:3]
         initial = self._get_initial_ball(guess, bounds, nchains)
 
-        self.mcmc_res = emcee.EnsembleSampler(nchains, initial.shape[1], _lnl,
-                                              args=(self.m, self.nm, self.mmin, self.V, bounds,
-                                                    self.prior_func, self.prior_kwargs,
-                                                    debug, False), **kwargs)
-        if warmup:
-            initial, _, _ = self.mcmc_res.run_mcmc(initial, warmup, storechain=False)
-            self.mcmc_res.reset()
+        evaluator = self.evaluator(debug)
+        if vectorize and kwargs.get("pool") is None:
+            if _emcee3():
+                kwargs["vectorize"] = True
+                evaluator = evaluator.lnL_batch
+            else:
+                kwargs["pool"] = _BatchMap(evaluator)
+
+        self.mcmc_res = emcee.EnsembleSampler(nchains, initial.shape[1], evaluator, **kwargs)
+        if chainfile is not None:
+            if target_ess is not None:
+                raise ValueError("target_ess cannot be used with a chainfile")
+            self._run_mcmc_to_file(initial, warmup, iterations, chainfile, resume, checkpoint)
+            return self.mcmc_res
+
+        start = time.time()
+        if target_ess is not None:
+            warmup = self._run_mcmc_adaptive(initial, warmup, iterations, target_ess, checkpoint, debug)
+        else:
+            if warmup:
+                initial = tuple(self.mcmc_res.run_mcmc(initial, warmup, **_nostore()))[0]
+                self.mcmc_res.reset()
+
+            self.mcmc_res.run_mcmc(initial, iterations)
+
+        chain = self.mcmc_res.chain
+        if chain.shape[1]:
+            tau = integrated_time(np.swapaxes(chain, 0, 1))
+            ess = chain.shape[0] * chain.shape[1] / tau
+            elapsed = time.time() - start
+            self.mcmc_diagnostics = dict(warmup=warmup, iterations=chain.shape[1], tau=tau, ess=ess,
+                                         time=elapsed, ess_per_sec=ess.min() / elapsed)
+            if debug:
+                print("MCMC: %s warmup and %s kept steps, ESS=%s (%.1f per second)" %
+                      (warmup, chain.shape[1], ess, ess.min() / elapsed))
+
+        if self.profile_lnA:
+            chain = self.mcmc_res.chain
+            lnA_rs = _derived_random_state(self.mcmc_res.random_state)
+            self.mcmc_lnA = self.evaluator().sample_lnA(chain.reshape((-1, 3)), lnA_rs).reshape(chain.shape[:-1])
+
+        return self.mcmc_res
 
+    def _run_mcmc_adaptive(self, initial, warmup, iterations, target_ess, check_every, debug):
+        """
+        Run the sampler :attr:`mcmc_res` in blocks of `check_every` steps, ending warmup once the autocorrelation
+        time is stable, and sampling once `target_ess` effective samples are kept. Returns the number of
+        warmup steps.
+        """
+        sampler = self.mcmc_res
+        nchains = initial.shape[0]
+        lnprob, rstate = None, None
+
+        def advance(pos, lnprob, rstate, n):
+            for state in sampler.sample(pos, lnprob, rstate, iterations=n):
+                pass
+            return tuple(state)[:3]
+
+        # Warmup, estimating tau from the latter half of the chain so far.
+        nwarm, tau_old = 0, np.inf
+        while nwarm < warmup:
+            initial, lnprob, rstate = advance(initial, lnprob, rstate, min(check_every, warmup - nwarm))
+            nwarm += min(check_every, warmup - nwarm)
+            chain = sampler.chain
+            tau = integrated_time(np.swapaxes(chain[:, chain.shape[1] // 2:], 0, 1)).max()
+            if debug:
+                print("Warmup: %s steps, tau=%.1f" % (nwarm, tau))
+            if nwarm >= 10 * tau and abs(tau - tau_old) < 0.05 * tau:
+                break
+            tau_old = tau
+        sampler.reset()
+
+        n = 0
+        while n < iterations:
+            initial, lnprob, rstate = advance(initial, lnprob, rstate, min(check_every, iterations - n))
+            n += min(check_every, iterations - n)
+            tau = integrated_time(np.swapaxes(sampler.chain, 0, 1)).max()
+            if debug:
+                print("Sampling: %s steps, tau=%.1f, ESS=%.0f" % (n, tau, n * nchains / tau))
+            if n >= 10 * tau and n * nchains / tau >= target_ess:
+                break
+
+        return nwarm
+
+    def _run_mcmc_to_file(self, initial, warmup, iterations, chainfile, resume, checkpoint):
+        """
+        Run the sampler :attr:`mcmc_res` in blocks of `checkpoint` steps, appending each block (after warmup)
+        to `chainfile` and saving the sampler state.
+        """
+        sampler = self.mcmc_res
+        nchains, ndim = initial.shape
+        lnprob = None
+
+        if resume and os.path.exists(_state_file(chainfile)):
+            state = _load_state(chainfile)
+            if state["pos"].shape != initial.shape:
+                raise ValueError("The stored walkers, of shape %s, do not match those requested, of shape %s" %
+                                 (state["pos"].shape, initial.shape))
+            if state["warmup"] != warmup:
+                raise ValueError("The stored run has warmup=%s, but warmup=%s was requested" %
+                                 (state["warmup"], warmup))
+            initial, lnprob, nsteps = state["pos"], state["lnprob"], state["nsteps"]
+            sampler.random_state = state["rstate"]
+            lnA_rs = np.random.RandomState()
+            lnA_rs.set_state(state["lnA_rstate"])
+
+            # Discard anything written after the last checkpoint.
+            with open(chainfile, "ab") as f:
+                f.truncate(max(nsteps - warmup, 0) * nchains * 5 * 8)
+        else:
+            nsteps = 0
+            lnA_rs = _derived_random_state(sampler.random_state)
+            open(chainfile, "wb").close()
+
+        block = np.empty((checkpoint, nchains, 5))
+        ev = self.evaluator()
+        total = warmup + iterations
+        while nsteps < total:
+            # Blocks never straddle the end of warmup, so that each is either entirely written or not.
+            n = min(checkpoint, total - nsteps, warmup - nsteps if nsteps < warmup else total)
+            for i, state in enumerate(sampler.sample(initial, lnprob, sampler.random_state, iterations=n,
+                                                     **_nostore())):
+                initial, lnprob = tuple(state)[:2]
+                if nsteps >= warmup:
+                    block[i, :, :ndim] = initial
+                    block[i, :, -1] = lnprob
+
+            if nsteps >= warmup:
+                if self.profile_lnA:
+                    thetas = block[:n, :, :3].reshape((-1, 3))
+                    block[:n, :, 3] = ev.sample_lnA(thetas, lnA_rs).reshape((n, nchains))
+                with open(chainfile, "ab") as f:
+                    block[:n].tofile(f)
+
+            nsteps += n
+            _save_state(chainfile, initial, lnprob, sampler.random_state, lnA_rs.get_state(), nsteps, warmup,
+                        iterations)
+
+        self.mcmc_chain = load_chain(chainfile)
+        if self.profile_lnA:
+            self.mcmc_lnA = self.mcmc_chain[..., 3]
+
+    def run_hmc(self, n_samples=1000, warmup=500, hs0=14.5, alpha0=-1.9, beta0=0.8, lnA0=-26.0, opt_init=True,
+                opt_kw=None, dense=True, target_accept=0.8, path_length=np.pi / 2, random_state=None, debug=0):
+        """
+        Per-object MCMC fit using Hamiltonian Monte Carlo, driven by the analytic jacobian.
 
-        self.mcmc_res.run_mcmc(initial, iterations)
+        The mass matrix is the (negative) hessian of the log-likelihood at the starting point. In the coordinates
+        it defines, a Gaussian posterior is isotropic with unit variance, and the default `path_length` (a
+        quarter period) yields nearly independent samples. The step size is adapted during warmup by dual
+        averaging, and is jittered by up to 10% thereafter. Since the posterior is closer to Gaussian in
+        ``[logHs, alpha, beta]`` alone, sampling is most efficient with `profile_lnA`.
 
-        return self.mcmc_res
+        Parameters
+        ----------
+        n_samples : int, optional
+            Number of samples to keep.
+
+        warmup : int, optional
+            Number of (discarded) warmup transitions, over which the step size is adapted.
+
+        hs0, alpha0, beta0, lnA0: float, optional
+            Initial guess for each of the MRP parameters. `lnA0` is ignored if `profile_lnA`.
+
+        opt_init : bool, optional
+            Whether to start from the result of :meth:`run_downhill` (recommended, as the hessian at a poor
+            starting point may be a poor mass matrix).
+
+        opt_kw : dict, optional
+            Any arguments to pass to the downhill run.
+
+        dense : bool, optional
+            Whether to use the full inverse hessian as the mass matrix, rather than only its diagonal.
+
+        target_accept : float, optional
+            Target mean acceptance probability for step size adaptation.
+
+        path_length : float, optional
+            Integration time of each trajectory (in the units of the standardised posterior).
+
+        random_state : :class:`numpy.random.RandomState`, optional
+            The source of random numbers.
+
+        debug : int, optional
+            Set the level of info printed out throughout the function.
+
+        Returns
+        -------
+        hmc_res : :class:`scipy.optimize.OptimizeResult`
+            With attributes ``chain`` (the ``(n_samples, ndim)`` samples), ``lnprob``, ``accept_rate``,
+            ``step_size``, ``n_steps`` (leapfrog steps per transition), ``divergences`` (the number of
+            trajectories leaving the bounds, or with large energy errors, during sampling),
+            ``nfev`` (likelihood and jacobian evaluations during sampling), and ``tau`` and ``ess`` (the
+            autocorrelation time and effective sample size of each parameter). Also stored as :attr:`hmc_res`.
+            If `profile_lnA`, conditional draws of `lnA` are stored in :attr:`hmc_lnA`.
+
+        Examples
+        --------
+        >>> from mrpy.base.stats import TGGD
+        >>> r = TGGD(scale=1e14,a=-1.8,b=1.0,xmin=1e12).rvs(1e5)
+        >>> FitObj = SimFit(r, profile_lnA=True)
+        >>> res = FitObj.run_hmc(n_samples=500, opt_kw=dict(method="newton"))
+        >>> print res.chain.mean(axis=0), res.ess
+        """
+        random_state = random_state or np.random.RandomState()
+        if opt_kw is None:
+            opt_kw = {}
+
+        x = np.array([hs0, alpha0, beta0, lnA0])
+        if opt_init:
+            if not hasattr(self, "downhill_res"):
+                self.run_downhill(hs0, alpha0, beta0, lnA0, debug, **opt_kw)
+            if self.downhill_res.success:
+                x = self.downhill_res.x
+            else:
+                print("WARNING: Optimization failed. Falling back on given initial parameters.")
+        if self.profile_lnA:
+            x = x[:3]
+
+        evaluator = self.evaluator(debug)
+        ll, jac, hess = evaluator.evaluate(x, want_jac=True, want_hess=True)
+        L = _hmc_scale(hess, dense)
+        adapt = _DualAveraging(1.0, target_accept)
+
+        def n_steps(step_size):
+            return max(1, int(np.ceil(path_length / step_size)))
+
+        for i in range(warmup):
+            x, ll, jac, a, _, _ = _hmc_transition(evaluator, x, ll, jac, L, adapt.step_size,
+                                               n_steps(adapt.step_size), random_state)
+            adapt.update(a)
+
+        step_size = adapt.final_step_size if warmup else adapt.step_size
+        if debug:
+            print("HMC step size: %s (%s leapfrog steps)" % (step_size, n_steps(step_size)))
+
+        chain = np.empty((n_samples, len(x)))
+        lnprob = np.empty(n_samples)
+        accept, divergences, nfev = 0.0, 0, 0
+        for i in range(n_samples):
+            eps = step_size * random_state.uniform(0.9, 1.1)
+            x, ll, jac, a, div, n = _hmc_transition(evaluator, x, ll, jac, L, eps, n_steps(eps), random_state)
+            chain[i], lnprob[i] = x, ll
+            accept += a
+            divergences += div
+            nfev += n
+
+        tau = integrated_time(chain[:, np.newaxis]) if n_samples else np.nan
+        self.hmc_res = opt.OptimizeResult(chain=chain, lnprob=lnprob, accept_rate=accept / max(n_samples, 1),
+                                          step_size=step_size, n_steps=n_steps(step_size),
+                                          divergences=divergences, nfev=nfev, tau=tau, ess=n_samples / tau)
+        if self.profile_lnA:
+            self.hmc_lnA = evaluator.sample_lnA(chain, random_state)
+        if debug:
+            print("HMC: acceptance %.2f, %s divergences, ESS=%s from %s evaluations" %
+                  (self.hmc_res.accept_rate, divergences, self.hmc_res.ess, nfev))
+
+        return self.hmc_res
+
+    def run_laplace(self, n_samples=1000, importance=True, df=None, hs0=14.5, alpha0=-1.9, beta0=0.8,
+                    lnA0=-26.0, opt_kw=None, random_state=None, debug=0):
+        """
+        Approximate posterior samples from the Laplace approximation at the optimum, optionally corrected by
+        importance sampling.
+
+        Samples are drawn from a Gaussian (or multivariate-t) centred on the result of :meth:`run_downhill`,
+        with covariance the inverse of the (negative) analytic hessian there. If `importance`, they are
+        weighted by the ratio of the exact posterior (evaluated in a single pass with
+        :meth:`SampleEvaluator.lnL_batch`) to the proposal, with Pareto-smoothed importance sampling (PSIS).
+        The estimated Pareto shape, ``pareto_k``, diagnoses the reliability of the weights: below 0.5 they are
+        reliable, and above 0.7 the proposal is too poor for them to be useful (in which case, try a small
+        `df`, or MCMC).
+
+        Parameters
+        ----------
+        n_samples : int, optional
+            Number of samples to draw.
+
+        importance : bool, optional
+            Whether to weight samples by the exact posterior.
+
+        df : float, optional
+            If given, draw from a multivariate-t distribution with `df` degrees of freedom, whose heavier
+            tails make the weights more robust.
+
+        hs0, alpha0, beta0, lnA0: float, optional
+            Initial guess for the downhill optimization, if it has not already been run.
+
+        opt_kw : dict, optional
+            Any arguments to pass to the downhill run.
+
+        random_state : :class:`numpy.random.RandomState`, optional
+            The source of random numbers.
+
+        debug : int, optional
+            Set the level of info printed out throughout the function.
+
+        Returns
+        -------
+        laplace_res : :class:`scipy.optimize.OptimizeResult`
+            With attributes ``x`` (the optimum), ``laplace_cov`` (the covariance of the approximation),
+            ``samples`` (the ``(n_samples, ndim)`` draws), ``log_weights`` (their normalised log importance
+            weights, uniform unless `importance`), ``pareto_k``, ``ess`` (the effective sample size of the
+            weights), ``mean`` and ``cov`` (the weighted posterior mean and covariance), and ``resampled``
+            (``n_samples`` draws resampled according to the weights). Also stored as :attr:`laplace_res`. If
+            `profile_lnA`, conditional draws of `lnA` for ``resampled`` are stored in :attr:`laplace_lnA`.
+
+        Examples
+        --------
+        >>> from mrpy.base.stats import TGGD
+        >>> r = TGGD(scale=1e14,a=-1.8,b=1.0,xmin=1e12).rvs(1e5)
+        >>> FitObj = SimFit(r, profile_lnA=True)
+        >>> res = FitObj.run_laplace(n_samples=2000, opt_kw=dict(method="newton"))
+        >>> print res.pareto_k, res.mean, np.sqrt(np.diag(res.cov))
+        """
+        random_state = random_state or np.random.RandomState()
+        if opt_kw is None:
+            opt_kw = {}
+
+        if not hasattr(self, "downhill_res"):
+            self.run_downhill(hs0, alpha0, beta0, lnA0, debug, **opt_kw)
+        if not self.downhill_res.success:
+            print("WARNING: Optimization failed. The Laplace approximation may be poor.")
+        x = self.downhill_res.x[:3] if self.profile_lnA else self.downhill_res.x
+
+        evaluator = self.evaluator(debug)
+        hess = evaluator.evaluate(x, want_jac=True, want_hess=True)[2]
+        L = _hmc_scale(hess)
+        ndim = len(x)
+
+        z = random_state.normal(size=(n_samples, ndim))
+        if df is None:
+            log_q = -np.sum(z ** 2, axis=1) / 2
+        else:
+            u = random_state.chisquare(df, size=n_samples) / df
+            z /= np.sqrt(u)[:, np.newaxis]
+            log_q = -(df + ndim) / 2.0 * np.log1p(np.sum(z ** 2, axis=1) / df)
+        samples = x + np.dot(z, L.T)
+
+        if importance:
+            log_w, k = _psis(evaluator.lnL_batch(samples) - log_q)
+            if k > 0.7:
+                print("WARNING: Pareto k=%.2f > 0.7; the importance weights are unreliable." % k)
+        else:
+            log_w, k = np.full(n_samples, -np.log(n_samples)), np.nan
+
+        w = np.exp(log_w)
+        mean = np.dot(w, samples)
+        cov = np.dot(w * (samples - mean).T, samples - mean)
+        resampled = samples[random_state.choice(n_samples, size=n_samples, p=w / w.sum())]
+
+        self.laplace_res = opt.OptimizeResult(x=x, laplace_cov=np.dot(L, L.T), samples=samples, log_weights=log_w,
+                                              pareto_k=k, ess=1 / np.sum(w ** 2), mean=mean, cov=cov,
+                                              resampled=resampled)
+        if self.profile_lnA:
+            self.laplace_lnA = evaluator.sample_lnA(resampled, random_state)
+        if debug:
+            print("Laplace: Pareto k=%s, ESS=%.0f of %s samples" % (k, self.laplace_res.ess, n_samples))
+
+        return self.laplace_res
 
     def lnL(self, p, ret_jac=False, debug=0):
         """
@@ -448,9 +1617,217 @@ class SimFit(object):
             Returned only if `ret_jac` is `True`. The jacobian at the current parameter vector.
 
         """
-        bounds = [self.hs_bounds, self.alpha_bounds, self.beta_bounds,self.lnA_bounds]
-        return _lnl(p, self.m, self.nm, self.mmin, self.V,bounds, self.prior_func,self.prior_kwargs,debug, ret_jac)
+        ll, jac, _ = self.evaluator(debug).evaluate(p, want_jac=ret_jac)
+        if ret_jac:
+            return ll, jac
+        else:
+            return ll
+
+
+
+
+
 
+class BinnedFit(SimFit):
+    """
+    Poisson fits to histograms of masses.
+
+    This is the binned equivalent of :class:`SimFit`, using the likelihood of
+    :class:`~mrpy.extra.likelihoods.BinnedPoissonLike`, whose cost scales with the number of bins rather
+    than of masses. The fitting routines (:meth:`run_downhill`, :meth:`run_mcmc` and :meth:`lnL`) are
+    the same as those of :class:`SimFit`.
+
+    Parameters
+    ----------
+    counts : array or list of arrays
+        Number of masses in each bin. Either an array or a list of arrays, each of which is a sample
+        *to be analysed simultaneously*.
 
+    edges : array or list of arrays
+        Increasing bin edges (masses, not log-masses) of each sample, each one longer than its `counts`.
+        The lowest edge is the truncation mass.
 
+    V : array, optional
+        The volume of each subsample.
+
+    Other Parameters
+    ----------------
+    hs_bounds, alpha_bounds, beta_bounds, lnA_bounds, prior_func, prior_kwargs, profile_lnA :
+        As for :class:`SimFit`.
+    """
+
+    def __init__(self, counts, edges, V=1.0,
+                 hs_bounds=(10, 16), alpha_bounds=(-1.99, -1.3),
+                 beta_bounds=(0.1, 2.0), lnA_bounds=(-40, -10),
+                 prior_func=None, prior_kwargs=None, profile_lnA=False):
+
+        if np.isscalar(counts[0]):
+            counts, edges, V = [counts], [edges], np.array([V]).flatten()
+        elif np.isscalar(V):
+            V = [V] * len(counts)
+
+        self.counts = [np.asarray(n, dtype=float) for n in counts]
+        self.edges = [np.asarray(e, dtype=float) for e in edges]
+        self.V = V
+        self.mmin = [e[0] for e in self.edges]
+        self.log_mmin = [np.log10(x) for x in self.mmin]
+
+        self._set_options(hs_bounds, alpha_bounds, beta_bounds, lnA_bounds, prior_func, prior_kwargs, profile_lnA)
+
+    def evaluator(self, debug=0):
+        """
+        A :class:`BinnedEvaluator` for the histograms, with the current bounds and priors.
+        """
+        return BinnedEvaluator(self.counts, self.logm, self.V, self._bounds, self.prior_func, self.prior_kwargs,
+                               debug, self.profile_lnA)
+
+    @property
+    def logm(self):
+        """
+        Log10 bin edges of each sample.
+        """
+        return [np.log10(x) for x in self.edges]
+
+    def append(self, counts, dataset=0):
+        """
+        Add counts (in the same bins) to one of the histograms, for instance as a catalogue grows.
+        """
+        self.counts[dataset] = self.counts[dataset] + counts
+        if hasattr(self, "downhill_res"):
+            del self.downhill_res
+
+    def _downhill_obj(self, x):
+        return [lk.BinnedPoissonLike(edges, n, logHs=x[0], alpha=x[1], beta=x[2], lnA=x[3] + np.log(V))
+                for n, edges, V in zip(self.counts, self.logm, self.V)]
+
+
+def _to_shared(a, folder, name):
+    """
+    Save array `a` (or each of a list of arrays) to a ``.npy`` file in `folder`, returning the path(s), so that
+    worker processes may memory-map rather than copy it. Paths (and None) are returned unchanged.
+    """
+    if a is None or isinstance(a, string_types):
+        return a
+    if isinstance(a, (list, tuple)):
+        return [_to_shared(x, folder, "%s_%s" % (name, i)) for i, x in enumerate(a)]
+    path = os.path.join(folder, name + ".npy")
+    np.save(path, np.asarray(a))
+    return path
+
+
+# Fields of the table returned by fit_suite.
+_suite_dtype = [("logHs", float), ("alpha", float), ("beta", float), ("lnA", float), ("lnL", float),
+                ("success", bool), ("nit", int), ("nfev", int)]
+
+
+def _fit_chain(args):
+    """
+    Fit each of a sequence of catalogues in turn, optionally starting each from the solution of the previous.
+    """
+    jobs, fit_kw, downhill_kw, warm_start = args
+    downhill_kw = dict(downhill_kw)
+    rows = []
+    for m, nm, mmin, V in jobs:
+        fit = SimFit(m, nm, mmin, V, **fit_kw)
+        res = fit.run_downhill(**downhill_kw)[0]
+
+        p = np.append(res.x, res.lnA) if fit.profile_lnA else res.x
+        lnl = -res.fun
+        if fit.prior_func is not None:
+            lnl -= fit.prior_func(res.x, **fit.prior_kwargs)[0]
+        rows.append(tuple(p) + (lnl, res.success, res.get("nit", -1), res.get("nfev", -1)))
+
+        if warm_start == "previous" and res.success:
+            downhill_kw.update(hs0=p[0], alpha0=p[1], beta0=p[2], lnA0=p[3])
+    return rows
+
+
+def fit_suite(catalogues, nm=None, mmin=None, V=1.0, n_workers=1, warm_start="previous", fit_kw=None,
+              **downhill_kw):
+    """
+    Fit the MRP to each of a suite of catalogues (eg. snapshots of a simulation), with :class:`SimFit`.
+
+    Independent fits are distributed over a pool of processes. Catalogues are passed to the processes as
+    ``.npy`` files, which are memory-mapped (and thus shared through the operating system's page cache)
+    rather than pickled and copied.
+
+    Parameters
+    ----------
+    catalogues : list
+        Each item is anything accepted as the masses, `m`, of :class:`SimFit`: an array, the path to a ``.npy``
+        file, or a list of these (to be fit simultaneously).
+
+    nm : list, optional
+        The weights of each catalogue (see :class:`SimFit`), or None.
+
+    mmin, V : float or list, optional
+        The truncation mass and volume, either for all catalogues or each of them.
+
+    n_workers : int, optional
+        Number of processes over which to distribute the fits. If None, the number of CPUs.
+
+    warm_start : {"previous", None}, optional
+        If "previous", each fit is started from the solution for the previous catalogue, which is useful where
+        neighbouring catalogues (eg. consecutive snapshots) have similar parameters. To preserve this while
+        fitting in parallel, the catalogues are split into `n_workers` consecutive runs, and only the first of
+        each run is started from the initial guess given in `downhill_kw`.
+
+    fit_kw : dict, optional
+        Arguments to :class:`SimFit` (eg. bounds, or ``profile_lnA``). Any prior function must be defined at the
+        top level of a module, so that it can be sent to the worker processes.
+
+    downhill_kw :
+        Arguments to :meth:`SimFit.run_downhill` (eg. initial guesses, or ``method``).
+
+    Returns
+    -------
+    results : structured array
+        A record for each catalogue, with fields ``logHs``, ``alpha``, ``beta``, ``lnA`` (the solution),
+        ``lnL`` (the log-likelihood at the solution, excluding any prior), ``success``, ``nit`` and ``nfev`` (from
+        the optimizer).
+
+    Examples
+    --------
+    >>> from mrpy.base.stats import TGGD
+    >>> catalogues = [TGGD(scale=10**h, a=-1.8, b=1.0, xmin=1e12).rvs(1e4) for h in [13.8, 13.9, 14.0]]
+    >>> res = fit_suite(catalogues, n_workers=2, fit_kw=dict(profile_lnA=True), method="newton")  # doctest: +SKIP
+    >>> res["logHs"]  # doctest: +SKIP
+    """
+    n = len(catalogues)
+    nm = [None] * n if nm is None else nm
+    mmin = mmin if isinstance(mmin, (list, tuple, np.ndarray)) else [mmin] * n
+    V = V if isinstance(V, (list, tuple, np.ndarray)) else [V] * n
+    fit_kw = fit_kw or {}
+    if n_workers is None:
+        n_workers = multiprocessing.cpu_count()
+    n_workers = max(min(n_workers, n), 1)
+
+    folder = tempfile.mkdtemp() if n_workers > 1 else None
+    try:
+        if folder is not None:
+            catalogues = [_to_shared(m, folder, "m%s" % i) for i, m in enumerate(catalogues)]
+            nm = [_to_shared(w, folder, "nm%s" % i) for i, w in enumerate(nm)]
+
+        jobs = list(zip(catalogues, nm, mmin, V))
+        if warm_start == "previous":
+            # Consecutive runs of catalogues, one per worker.
+            edges = np.linspace(0, n, n_workers + 1).astype(int)
+            chains = [jobs[i:j] for i, j in zip(edges[:-1], edges[1:])]
+        else:
+            chains = [[job] for job in jobs]
+        args = [(c, fit_kw, downhill_kw, warm_start) for c in chains]
+
+        if n_workers > 1:
+            pool = multiprocessing.Pool(n_workers)
+            try:
+                rows = pool.map(_fit_chain, args)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            rows = list(map(_fit_chain, args))
+    finally:
+        if folder is not None:
+            shutil.rmtree(folder)
 
+    return np.array([row for chain in rows for row in chain], dtype=_suite_dtype)
@@ -57,6 +57,17 @@ def test_ngtm_pdf():
     assert core.ngtm(m,14.0,-1.9,0.8)[0] == 1
 
 
+def test_profile_ngtm_pdf():
+    m = np.logspace(10,12,20)
+    assert core.profile(m,14.0,-1.95,0.5,quantities=("ngtm",))["ngtm"][0] == 1
+
+
+def test_unicode_norm():
+    m = np.logspace(10,12,20)
+    assert core.ngtm(m,14.0,-1.9,0.8,norm=u"pdf")[0] == 1
+    assert np.allclose(core.dndm(m,14.0,-1.9,0.8,norm=u"rhom"), core.dndm(m,14.0,-1.9,0.8,norm="rhom"))
+
+
 def test_log_mass_mode():
     lmm = core.log_mass_mode(14.0,-1.8,0.7)
     m = np.linspace(np.log10(lmm)-1,np.log10(lmm)+1,200)
@@ -111,3 +122,118 @@ class TestMRP(object):
         s = spline(m,mrp,k=4)
         assert np.isclose(lmm,10**s.derivative().roots())
 
+
+
+def test_mrp_cache_invalidation():
+    logm = np.linspace(10, 15, 50)
+    mrp = core.MRP(logm, 14.0, -1.9, 0.75)
+    assert mrp.dndm() is mrp.dndm()
+    nbar, A = mrp.nbar, mrp.A
+
+    for attr, val in [("logHs", 13.5), ("alpha", -1.8), ("beta", 0.9), ("log_mmin", 11.0)]:
+        setattr(mrp, attr, val)
+        fresh = core.MRP(logm, mrp.logHs, mrp.alpha, mrp.beta, log_mmin=mrp.log_mmin)
+        assert np.allclose(mrp.dndm(), fresh.dndm())
+        assert np.isclose(mrp.A, fresh.A)
+
+    mrp.norm = 0.0
+    assert np.isclose(mrp.A, 1.0)
+
+    mrp.logm = logm + 1
+    assert np.allclose(mrp.m, 10**(logm + 1))
+
+    mrp = core.MRP(logm, 14.0, -1.9, 0.75, norm="rhom")
+    A = mrp.A
+    mrp.rhom = 2 * mrp.rhom
+    assert np.isclose(mrp.A, 2 * A)
+    assert mrp.rhom == core.MRP(logm, 14.0, -1.9, 0.75, rhom=mrp.rhom).rhom
+
+
+def test_dndm_batch():
+    np.random.seed(1234)
+    n = 1000
+    samples = np.column_stack((14 + 0.1 * np.random.randn(n), -1.85 + 0.02 * np.random.randn(n),
+                               0.8 + 0.05 * np.random.randn(n)))
+    m = np.logspace(10, 15, 20)
+
+    # Unchunked evaluation should match a simple loop
+    loop = np.array([core.dndm(m, *s) for s in samples[:50]])
+    batch = core.dndm_batch(m, samples[:50], quantiles=[0, 1])
+    assert np.allclose(batch, [loop.min(axis=0), loop.max(axis=0)], rtol=1e-8)
+
+    # Chunked evaluation should be close to the exact result.
+    exact = core.dndm_batch(m, samples, chunksize=n)
+    chunked = core.dndm_batch(m, samples, chunksize=100)
+    assert np.allclose(chunked, exact, rtol=1e-2)
+
+
+def test_sorted_grid():
+    m = np.logspace(10, 16, 2000)
+    for f in [core.ngtm, core.rho_gtm]:
+        assert np.allclose(f(m, 14.0, -1.9, 0.75, sorted_grid=True), f(m, 14.0, -1.9, 0.75), rtol=1e-10, atol=0)
+    # Anchors closer than the grid length
+    assert np.allclose(core._integral_sorted(m, 14.0, -1.9, 0.75, anchor=7),
+                       core.ngtm(m, 14.0, -1.9, 0.75, norm=1.0), rtol=1e-10, atol=0)
+
+    # A coarse grid, on which the quadrature would be inaccurate
+    m = np.logspace(10, 16, 6)
+    for f in [core.ngtm, core.rho_gtm]:
+        assert np.allclose(f(m, 14.0, -1.9, 0.75, sorted_grid=True), f(m, 14.0, -1.9, 0.75), rtol=1e-10, atol=0)
+
+
+def test_mass_grid():
+    logm = np.linspace(10, 15, 200)
+    grid = core.MassGrid(logm)
+    for log in [False, True]:
+        assert np.allclose(core.dndm(grid, 14.0, -1.9, 0.75, log=log), core.dndm(10**logm, 14.0, -1.9, 0.75, log=log))
+
+    with_grid = core.MRP(grid, 14.0, -1.9, 0.75)
+    without = core.MRP(logm, 14.0, -1.9, 0.75)
+    for q in ["dndm", "dndlog10m", "ngtm", "rho_gtm"]:
+        assert np.allclose(getattr(with_grid, q)(), getattr(without, q)())
+
+    # Re-assigning parameters re-uses the grid
+    with_grid.logHs = 13.0
+    assert with_grid.m is grid.m
+    assert np.allclose(with_grid.dndm(), core.MRP(logm, 13.0, -1.9, 0.75).dndm())
+
+
+def test_vectorised_parameters():
+    logHs = np.linspace(12, 15, 5)[:, np.newaxis]
+    alpha = np.linspace(-2.1, -1.5, 6)
+    beta = 0.8
+
+    lmm = core.log_mass_mode(logHs, alpha, beta)
+    assert lmm.shape == (5, 6)
+    for i, h in enumerate(logHs[:, 0]):
+        for j, a in enumerate(alpha):
+            if a < -2:
+                assert lmm[i, j] == 0
+            else:
+                assert np.isclose(lmm[i, j], core.log_mass_mode(h, a, beta))
+
+    alpha = np.linspace(-1.99, -1.5, 6)
+    mrp = core.MRP(11.0, logHs, alpha, beta, norm="rhom")
+    for q in ["nbar", "rhobar"]:
+        loop = [[getattr(core.MRP(11.0, h, a, beta, norm="rhom"), q) for a in alpha] for h in logHs[:, 0]]
+        assert np.allclose(getattr(mrp, q), loop, rtol=1e-10)
+
+
+def test_profile():
+    m = np.logspace(8, 16, 500)
+    for beta in [0.5, 0.7]:
+        for log in [False, True]:
+            p = core.profile(m, 14.0, -1.9, beta, log=log)
+            for q in ["dndm", "ngtm", "rho_gtm"]:
+                assert np.allclose(p[q], getattr(core, q)(m, 14.0, -1.9, beta, log=log), rtol=1e-10, atol=0)
+
+    mrp = core.MRP(np.log10(m), 14.0, -1.9, 0.5)
+    assert list(mrp.profile(["ngtm"]).keys()) == ["ngtm"]
+    assert np.allclose(mrp.profile()["rho_gtm"], mrp.rho_gtm(), rtol=1e-10)
+
+
+def test_gammainc_shift_cancellation():
+    # Tiny x with negative z forces the direct fallback
+    x = np.logspace(-30, 1, 50)
+    g = core._gammainc_shift(core.sp.gammainc_fast(-0.9, x), -0.9, x, x ** -0.9 * np.exp(-x), 2)
+    assert np.allclose(g, core.sp.gammainc_fast(1.1, x), rtol=1e-10)
@@ -1,10 +1,24 @@
+import os
+
 import numpy as np
 
 from mrpy.base.stats import TGGD
-from mrpy.fitting.fit_sample import SimFit
+from mrpy.fitting.fit_sample import SimFit, BinnedFit, fit_suite, load_chain, integrated_time, normal_prior
+from mrpy.extra.likelihoods import SampleLikeWeights, SampleLike, SelectionFunction, BinnedPoissonLike
 
 np.random.seed(42)
 
+
+def _tggd_sample(N):
+    """
+    A seeded sample of `N` masses from a fiducial TGGD, with its normalisation and bounds on lnA around it.
+    """
+    np.random.seed(42)
+    t = TGGD(scale=1e14, a=-1.8, b=1.0, xmin=1e12)
+    A = N / t._pdf_norm()
+    return t.rvs(N), A, dict(lnA_bounds=(np.log(A) - 5, np.log(A) + 5))
+
+
 def test_s0():
     np.random.seed(42)
     N = int(3e5)
@@ -95,4 +109,394 @@ def test_multisim():
 #
 #     print res.x
 #     assert res.success
-#     assert np.all(np.isclose(res.x,[14.0,-1.8,1.0],rtol=5e-2))
\ No newline at end of file
+#     assert np.all(np.isclose(res.x,[14.0,-1.8,1.0],rtol=5e-2))
+
+def test_evaluator():
+    np.random.seed(42)
+    r = TGGD(scale=1e14, a=-1.8, b=1.0, xmin=1e12).rvs(1e4)
+    FitObj = SimFit(r, V=2.0)
+    p = [14.0, -1.8, 1.0, -20.0]
+
+    ll, jac, hess = FitObj.evaluator().evaluate(p, want_jac=True, want_hess=True)
+    exact = SampleLikeWeights(np.ones_like(r), np.log10(r), 14.0, -1.8, 1.0, -20.0 + np.log(2.0))
+    assert np.isclose(ll, exact.lnL, rtol=1e-10)
+    assert np.allclose(jac, exact.jacobian, rtol=1e-10)
+    assert np.allclose(hess, exact.hessian, rtol=1e-10)
+
+    # Out of bounds
+    assert FitObj.lnL([14.0, -1.8, 1.0, 0.0]) == -np.inf
+
+
+def test_memmap():
+    import tempfile
+    np.random.seed(42)
+    r = TGGD(scale=1e14, a=-1.8, b=1.0, xmin=1e12).rvs(1e4)
+    fname = os.path.join(tempfile.mkdtemp(), "masses.npy")
+    np.save(fname, np.concatenate((r, [1e11])))  # extra mass below mmin is masked
+
+    p = [14.0, -1.8, 1.0, -20.0]
+    in_memory = SimFit(r).lnL(p, ret_jac=True)
+    mapped = SimFit(fname, mmin=r.min()).lnL(p, ret_jac=True)
+    assert np.isclose(mapped[0], in_memory[0], rtol=1e-10)
+    assert np.allclose(mapped[1], in_memory[1], rtol=1e-10)
+
+    # Unicode paths (on Python 2) are also loaded.
+    assert np.isclose(SimFit(u"%s" % fname, mmin=r.min()).lnL(p), in_memory[0], rtol=1e-10)
+
+
+def test_lnL_batch():
+    np.random.seed(42)
+    r = TGGD(scale=1e14, a=-1.8, b=1.0, xmin=1e12).rvs(1e4)
+    ev = SimFit(r, V=2.0).evaluator()
+    thetas = np.array([[14.0, -1.8, 1.0, -20.0], [13.5, -1.85, 0.9, -18.0], [14.0, -1.8, 1.0, 0.0]])
+    batch = ev.lnL_batch(thetas)
+    assert np.allclose(batch[:2], [ev(t) for t in thetas[:2]], rtol=1e-10)
+    assert batch[2] == -np.inf
+
+
+def test_mcmc_vectorized_warmup():
+    # Exercises the warmup call of whichever emcee API is installed.
+    r, A, bounds = _tggd_sample(int(1e4))
+    fit = SimFit(r, **bounds)
+    fit.run_mcmc(nchains=10, warmup=3, iterations=4, hs0=14.0, alpha0=-1.8, beta0=1.0, lnA0=np.log(A),
+                 vectorize=True)
+    assert fit.mcmc_res.chain.shape == (10, 4, 4)
+    assert np.all(np.isfinite(fit.mcmc_res.lnprobability))
+
+
+def test_append():
+    np.random.seed(42)
+    r = TGGD(scale=1e14, a=-1.8, b=1.0, xmin=1e12).rvs(1e4)
+    p = [14.0, -1.8, 1.0, -20.0]
+
+    fit = SimFit(r[:5000], mmin=1e12)
+    fit.append(r[5000:])
+    assert np.isclose(fit.lnL(p), SimFit(r, mmin=1e12).lnL(p), rtol=1e-10)
+
+
+def test_selection():
+    np.random.seed(42)
+    r = TGGD(scale=1e14, a=-1.8, b=1.0, xmin=1e12).rvs(1e4)
+    sel = SelectionFunction([11.5, 12.5, 13.5], [0.2, 0.8, 1.0])
+    p = [14.0, -1.8, 1.0, -20.0]
+
+    ll, jac = SimFit(r, V=sel).lnL(p, ret_jac=True)
+    exact = SampleLike(np.log10(r), *p, selection=sel)
+    assert np.isclose(ll, exact.lnL, rtol=1e-10)
+    assert np.allclose(jac, exact.jacobian, rtol=1e-8)
+
+    ev = SimFit(r, V=sel).evaluator()
+    thetas = np.array([p, [13.5, -1.85, 0.9, -18.0], [14.2, -1.7, 1.2, -21.0]])
+    assert np.allclose(ev.lnL_batch(thetas), [ev(t) for t in thetas], rtol=1e-10)
+
+    # The vectorised expected number matches that of the likelihood objects.
+    q = [SampleLike(np.log10(r), *t[:3], lnA=0, selection=sel)._Q for t in thetas]
+    assert np.allclose(ev._expected(thetas), q, rtol=1e-10)
+
+
+def test_binned():
+    np.random.seed(42)
+    N = int(1e5)
+    t = TGGD(scale=1e14, a=-1.8, b=1.0, xmin=1e12)
+    A = N / t._pdf_norm()
+    edges = np.logspace(12, 15.5, 36)
+    counts = np.histogram(t.rvs(N), edges)[0]
+
+    fit = BinnedFit(counts, edges, lnA_bounds=(np.log(A) - 5, np.log(A) + 5))
+    p = [14.0, -1.8, 1.0, np.log(A)]
+    exact = BinnedPoissonLike(np.log10(edges), counts, *p)
+    ll, jac = fit.lnL(p, ret_jac=True)
+    assert np.isclose(ll, exact.lnL, rtol=1e-10)
+    assert np.allclose(jac, exact.jacobian, rtol=1e-10)
+    assert np.isclose(fit.evaluator().lnL_batch([p])[0], ll, rtol=1e-10)
+
+    res, obj = fit.run_downhill(hs0=14, alpha0=-1.8, beta0=1.0, lnA0=np.log(A))
+    assert res.success
+    assert np.allclose(res.x, p, rtol=5e-2)
+
+
+def test_downhill_obj_volume():
+    # The returned likelihood objects reproduce the maximised likelihood for a non-unit volume.
+    r, A, _ = _tggd_sample(int(1e4))
+    lnA = np.log(A / 3.0)
+    kw = dict(hs0=14, alpha0=-1.8, beta0=1.0, lnA0=lnA)
+
+    res, obj = SimFit(r, V=3.0, lnA_bounds=(lnA - 5, lnA + 5)).run_downhill(**kw)
+    assert np.isclose(sum(o.lnL for o in obj), -res.fun, rtol=1e-8)
+
+    res, obj = BinnedFit(np.histogram(r, np.logspace(12, 15.5, 36))[0], np.logspace(12, 15.5, 36), V=3.0,
+                         lnA_bounds=(lnA - 5, lnA + 5)).run_downhill(**kw)
+    assert np.isclose(sum(o.lnL for o in obj), -res.fun, rtol=1e-8)
+
+
+def test_profile_lnA():
+    N = int(1e4)
+    r, A, bounds = _tggd_sample(N)
+
+    fit = SimFit(r, **bounds)
+    res = fit.run_downhill(hs0=14, alpha0=-1.8, beta0=1.0, lnA0=np.log(A))[0]
+
+    pfit = SimFit(r, profile_lnA=True)
+    pres = pfit.run_downhill(hs0=14, alpha0=-1.8, beta0=1.0)[0]
+    assert pres.success
+    assert -pres.fun >= -res.fun
+
+    # The profiled solution is a stationary point of the full likelihood.
+    ll, jac = fit.lnL(list(pres.x) + [pres.lnA], ret_jac=True)
+    assert np.isclose(ll, -pres.fun, rtol=1e-12)
+    assert np.all(np.abs(jac) < 0.1)
+
+    # The profile likelihood (and its batch version) equals the full likelihood at the profiled lnA.
+    ev = pfit.evaluator()
+    p = [14.0, -1.8, 1.0]
+    lnA = ev.lnA_hat(p)[0]
+    assert np.isclose(ev(p), fit.lnL(p + [lnA]), rtol=1e-10)
+    assert np.isclose(ev.lnL_batch([p])[0], ev(p), rtol=1e-10)
+
+    # The prior is a function of only the fitted parameters.
+    prior = dict(prior_func=normal_prior, prior_kwargs=dict(mean=[14.0, -1.9, 1.1], sd=[0.5, 0.1, 0.2]))
+    pev = SimFit(r, profile_lnA=True, **prior).evaluator()
+    ll, jac, _ = pev.evaluate(p, want_jac=True)
+    lp, ljac = normal_prior(p, **prior["prior_kwargs"])
+    assert np.isclose(ll, ev(p) + lp, rtol=1e-12)
+    assert np.allclose(jac, ev.evaluate(p, want_jac=True)[1] + ljac, rtol=1e-12)
+    assert np.isclose(pev.lnL_batch([p])[0], ll, rtol=1e-10)
+
+    pfit.run_mcmc(nchains=8, warmup=0, iterations=5, opt_init=True)
+    assert pfit.mcmc_res.chain.shape == (8, 5, 3)
+    assert pfit.mcmc_lnA.shape == (8, 5)
+    lnA_hat = ev.lnA_hat(pfit.mcmc_res.chain.reshape((-1, 3))).reshape((8, 5))
+    assert np.all(np.abs(pfit.mcmc_lnA - lnA_hat) < 5 / np.sqrt(N))
+
+
+def test_newton():
+    r, A, bounds = _tggd_sample(int(1e5))
+
+    res = SimFit(r, **bounds).run_downhill(hs0=14.5, alpha0=-1.9, beta0=0.8, lnA0=np.log(A) - 1)[0]
+    for method in ["newton", "trust-exact"]:
+        for profile in [False, True]:
+            fit = SimFit(r, profile_lnA=profile, **bounds)
+            nres = fit.run_downhill(hs0=14.5, alpha0=-1.9, beta0=0.8, lnA0=np.log(A) - 1, method=method)[0]
+            assert nres.success
+            assert nres.nit < 20
+            assert -nres.fun >= -res.fun - 1e-6
+            # The derivatives are with respect to the parameters, not the optimizer's variables.
+            ll, jac, hess = fit.evaluator().evaluate(nres.x, want_jac=True, want_hess=True)
+            assert np.allclose(nres.jac, -jac) and np.allclose(nres.hess, -hess)
+
+    # An active bound
+    nres = SimFit(r, beta_bounds=(0.1, 0.9), **bounds).run_downhill(hs0=14.5, alpha0=-1.9, beta0=0.8,
+                                                                    lnA0=np.log(A), method="newton")[0]
+    assert nres.success
+    assert nres.x[2] == 0.9
+
+    # Options
+    fit = SimFit(r, **bounds)
+    nres = fit.run_downhill(lnA0=np.log(A), method="newton", options=dict(maxiter=2, disp=False))[0]
+    assert nres.nit == 2 and not nres.success
+    try:
+        fit.run_downhill(lnA0=np.log(A), method="newton", options=dict(gtol=1e-3))
+        assert False
+    except ValueError:
+        pass
+
+
+def test_newton_nonfinite_start():
+    from mrpy.fitting.fit_sample import _newton
+
+    class Undefined(object):
+        def evaluate(self, theta, want_jac=False, want_hess=False):
+            return -np.inf, np.inf, np.inf
+
+    res = _newton(Undefined(), [14.0, -1.8, 1.0], [(10, 16), (-1.99, -1.3), (0.1, 2.0)])
+    assert not res.success
+    assert res.fun == np.inf
+
+
+def test_fit_suite():
+    np.random.seed(42)
+    N = int(2e4)
+    catalogues = [TGGD(scale=10**h, a=-1.8, b=1.0, xmin=1e12).rvs(N) for h in [13.8, 13.9, 14.0, 14.1]]
+    kw = dict(fit_kw=dict(profile_lnA=True), method="newton", hs0=14.0, alpha0=-1.8, beta0=1.0)
+
+    res = fit_suite(catalogues, n_workers=2, **kw)
+    assert len(res) == 4
+    assert np.all(res["success"])
+    for cat, row in zip(catalogues, res):
+        single = SimFit(cat, profile_lnA=True).run_downhill(hs0=14.0, alpha0=-1.8, beta0=1.0, method="newton")[0]
+        assert np.allclose([row["logHs"], row["alpha"], row["beta"]], single.x, atol=1e-3)
+        assert np.isclose(row["lnL"], -single.fun)
+
+    # Serial, cold-started fits give the same solutions
+    res_cold = fit_suite(catalogues, n_workers=1, warm_start=None, **kw)
+    assert np.allclose(res_cold["logHs"], res["logHs"], atol=1e-3)
+
+    # The lnL column excludes the prior
+    prior_kw = dict(mean=[14.0, -1.8, 1.0], sd=[1.0, 1.0, 1.0])
+    kw["fit_kw"] = dict(profile_lnA=True, prior_func=normal_prior, prior_kwargs=prior_kw)
+    res_prior = fit_suite(catalogues[:1], n_workers=1, **kw)
+    p = [res_prior[0][k] for k in ["logHs", "alpha", "beta", "lnA"]]
+    assert np.isclose(res_prior[0]["lnL"], SimFit(catalogues[0]).lnL(p), rtol=1e-8)
+
+
+def test_chainfile_resume():
+    import shutil
+    import tempfile
+
+    from mrpy.fitting.fit_sample import _load_state, _nostore
+
+    r, A, bounds = _tggd_sample(int(1e4))
+    folder = tempfile.mkdtemp()
+    chainfile = os.path.join(folder, "chain.dat")
+    try:
+        for profile in [False, True]:
+            fit = SimFit(r, profile_lnA=profile, **bounds)
+            kw = dict(nchains=10, warmup=3, hs0=14.0, alpha0=-1.8, beta0=1.0, lnA0=np.log(A), chainfile=chainfile,
+                      checkpoint=4)
+            fit.run_mcmc(iterations=6, **kw)
+            first = np.array(load_chain(chainfile))
+            assert first.shape == (6, 10, 5)
+            ndim = 3 if profile else 4
+            state = _load_state(chainfile)
+            assert np.all(state["pos"] == first[-1, :, :ndim])
+
+            # Pretend a run was interrupted after writing part of a block.
+            with open(chainfile, "ab") as f:
+                np.ones(7).tofile(f)
+
+            fit.run_mcmc(iterations=10, resume=True, **kw)
+            chain = fit.mcmc_chain
+            assert chain.shape == (10, 10, 5)
+            assert np.all(chain[:6] == first)
+            assert np.all(np.isfinite(chain))
+            # The resumed steps are exactly those sampled from the stored positions and random state.
+            steps = fit.mcmc_res.sample(state["pos"], state["lnprob"], state["rstate"], iterations=4, **_nostore())
+            for i, step in enumerate(steps):
+                assert np.all(chain[6 + i, :, :ndim] == tuple(step)[0])
+                assert np.all(chain[6 + i, :, -1] == tuple(step)[1])
+            if profile:
+                assert np.all(fit.mcmc_lnA == chain[..., 3])
+    finally:
+        shutil.rmtree(folder)
+
+
+def test_chainfile_resume_lnA():
+    # A run resumed part-way gives the same chain, including the draws of lnA, as one continued in one go.
+    import shutil
+    import tempfile
+    from mrpy.fitting.fit_sample import _state_file
+
+    r, A, bounds = _tggd_sample(int(1e4))
+    folder = tempfile.mkdtemp()
+    chainfile = os.path.join(folder, "chain.dat")
+    copy = os.path.join(folder, "copy.dat")
+    try:
+        fit = SimFit(r, profile_lnA=True, **bounds)
+        kw = dict(nchains=10, warmup=3, hs0=14.0, alpha0=-1.8, beta0=1.0, resume=True, checkpoint=4)
+        fit.run_mcmc(iterations=6, chainfile=chainfile, **kw)
+        shutil.copy(chainfile, copy)
+        shutil.copy(_state_file(chainfile), _state_file(copy))
+
+        fit.run_mcmc(iterations=10, chainfile=chainfile, **kw)
+        fit.run_mcmc(iterations=8, chainfile=copy, **kw)
+        fit.run_mcmc(iterations=10, chainfile=copy, **kw)
+        assert np.all(load_chain(copy) == load_chain(chainfile))
+    finally:
+        shutil.rmtree(folder)
+
+
+def test_integrated_time():
+    # An AR(1) process has tau = (1+rho)/(1-rho)
+    np.random.seed(42)
+    rho, n = 0.8, 20000
+    x = np.zeros((n, 8))
+    eps = np.random.normal(size=(n, 8))
+    for i in range(1, n):
+        x[i] = rho * x[i - 1] + eps[i]
+    assert np.isclose(integrated_time(x), (1 + rho) / (1 - rho), rtol=0.1)
+    assert integrated_time(np.dstack((x, eps))).shape == (2,)
+    assert np.isclose(integrated_time(eps), 1, rtol=0.1)
+
+
+def test_adaptive_mcmc():
+    r, A, bounds = _tggd_sample(int(1e4))
+    fit = SimFit(r, profile_lnA=True, **bounds)
+    fit.run_mcmc(nchains=20, warmup=2000, iterations=5000, target_ess=400, checkpoint=50, opt_init=True,
+                 opt_kw=dict(method="newton"))
+    d = fit.mcmc_diagnostics
+    assert d["warmup"] < 2000
+    assert d["iterations"] < 5000
+    assert np.all(d["ess"] >= 400)
+    assert d["iterations"] >= 10 * d["tau"].max()
+    assert d["ess_per_sec"] > 0
+    assert fit.mcmc_res.chain.shape[1] == d["iterations"]
+
+
+def test_hmc():
+    r, A, bounds = _tggd_sample(int(1e4))
+    fit = SimFit(r, profile_lnA=True, **bounds)
+    res = fit.run_hmc(n_samples=300, warmup=100, opt_kw=dict(method="newton"),
+                      random_state=np.random.RandomState(1))
+
+    x = fit.downhill_res.x
+    sd = np.sqrt(np.diag(np.linalg.inv(-fit.evaluator().evaluate(x, want_jac=True, want_hess=True)[2])))
+    assert res.chain.shape == (300, 3)
+    assert fit.hmc_lnA.shape == (300,)
+    assert 0.6 < res.accept_rate <= 1
+    assert res.divergences < 15
+    assert np.all(res.ess > 100)
+    assert np.all(np.abs(res.chain.mean(axis=0) - x) < 0.5 * sd)
+    assert np.allclose(res.chain.std(axis=0), sd, rtol=0.25)
+
+
+def test_hmc_transition_nfev():
+    from mrpy.fitting.fit_sample import _hmc_transition
+
+    class Gaussian(object):
+        # A standard normal, with an edge at x = 1 beyond which the likelihood is -inf.
+        def evaluate(self, x, want_jac=False):
+            if x[0] > 1:
+                return -np.inf, np.zeros(1), None
+            return -x[0] ** 2 / 2, -x, None
+
+    x0 = np.array([0.0])
+    rs = np.random.RandomState(0)
+    res = _hmc_transition(Gaussian(), x0, 0.0, np.zeros(1), np.eye(1), 0.01, 20, rs)
+    assert not res[4] and res[5] == 20
+
+    # A trajectory crossing the edge stops there, having evaluated fewer than n_steps points.
+    while True:
+        res = _hmc_transition(Gaussian(), x0, 0.0, np.zeros(1), np.eye(1), 0.2, 20, rs)
+        if res[4]:
+            break
+    assert res[0] == x0 and 0 < res[5] < 20
+
+
+def test_psis_pareto_k():
+    from mrpy.fitting.fit_sample import _psis
+    rs = np.random.RandomState(0)
+    z = rs.normal(size=4000)
+    # A proposal narrower than the target has heavy-tailed weights, k = 1 - 1/s^2 for a target of width s.
+    assert _psis(z ** 2 / 2 - z ** 2 / 8)[1] > 0.5
+    assert _psis(z ** 2 / 2 - z ** 2 / 1.28)[1] < 0
+    lw, k = _psis(rs.normal(size=1000))
+    assert np.isclose(np.sum(np.exp(lw)), 1)
+
+
+def test_laplace():
+    r, A, bounds = _tggd_sample(int(1e4))
+    fit = SimFit(r, profile_lnA=True, **bounds)
+    for df in [None, 5]:
+        res = fit.run_laplace(2000, df=df, opt_kw=dict(method="newton"), random_state=np.random.RandomState(1))
+        sd = np.sqrt(np.diag(res.laplace_cov))
+        assert res.pareto_k < 0.7
+        assert res.ess > 500
+        assert np.isclose(np.sum(np.exp(res.log_weights)), 1)
+        assert np.all(np.abs(res.mean - res.x) < 0.5 * sd)
+        assert np.allclose(np.sqrt(np.diag(res.cov)), sd, rtol=0.25)
+        assert res.resampled.shape == (2000, 3)
+        assert fit.laplace_lnA.shape == (2000,)
+
+    res = fit.run_laplace(100, importance=False)
+    assert np.isnan(res.pareto_k)
+    assert np.isclose(res.ess, 100)
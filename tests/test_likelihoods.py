@@ -7,7 +7,8 @@ import sys
 
 sys.path.insert(0, LOCATION)
 
-from mrpy.extra.likelihoods import SampleLike, CurveLike, SampleLikeWeights
+from mrpy.extra.likelihoods import SampleLike, CurveLike, SampleLikeWeights, SampleSummary, SampleLikeSummary, \
+    SampleLikeErrors, SelectionFunction, BinnedPoissonLike
 from mrpy._utils import numerical_hess, numerical_jac
 import numpy as np
 from mrpy.base.core import dndm
@@ -171,3 +172,226 @@ def test_weights():
 
     print standard.lnL, weighted.lnL
     assert np.isclose(standard.lnL, weighted.lnL, rtol=1e-8)
+
+
+def test_fused_derivatives():
+    logm = np.linspace(11, 15, 50)
+    w = np.arange(1, 51)
+    c = SampleLikeWeights(logm=logm, weights=w, logHs=14.0, alpha=-1.8, beta=0.75, lnA=0)
+    assert np.isclose(c.lnL, np.sum(w * c._lng) - c._q_, rtol=1e-12)
+    assert np.allclose(c.jacobian, np.sum(w * c._lng_jac, axis=1) - c._q_jac_, rtol=1e-12)
+    assert np.allclose(c.hessian, np.sum(w * c._lng_hess, axis=2) - c._q_hess_, rtol=1e-12)
+
+
+def test_summary():
+    logm = np.linspace(11, 15, 300)
+    w = np.arange(300) % 7 + 1
+    summary = SampleSummary(logm, w)
+
+    # Inside and outside the interpolated beta range
+    for h, a, b in [(14.0, -1.8, 0.75), (13.0, -1.9, 1.7), (14.5, -1.85, 2.5)]:
+        exact = SampleLikeWeights(w, logm, h, a, b, -20.0)
+        compressed = SampleLikeSummary(summary, h, a, b, -20.0)
+        assert np.isclose(compressed.lnL, exact.lnL, rtol=1e-10)
+        assert np.allclose(compressed.jacobian, exact.jacobian, rtol=1e-10)
+        assert np.allclose(compressed.hessian, exact.hessian, rtol=1e-10)
+
+
+def test_chunked():
+    logm = np.linspace(11, 15, 1000)
+    w = np.arange(1000) % 5 + 1
+    full = SampleLikeWeights(w, logm, 14.0, -1.8, 0.75, -20.0)
+    chunked = SampleLikeWeights(w, logm, 14.0, -1.8, 0.75, -20.0, chunksize=77)
+    assert np.isclose(chunked.lnL, full.lnL, rtol=1e-12)
+    assert np.allclose(chunked.jacobian, full.jacobian, rtol=1e-12)
+    assert np.allclose(chunked.hessian, full.hessian, rtol=1e-12)
+    assert "_x" not in chunked.__dict__
+
+
+def test_threaded():
+    logm = np.linspace(11, 15, 1000)
+    w = np.arange(1000) % 5 + 1
+    serial = SampleLikeWeights(w, logm, 14.0, -1.8, 0.75, -20.0, chunksize=77)
+    threaded = SampleLikeWeights(w, logm, 14.0, -1.8, 0.75, -20.0, chunksize=77, n_threads=3)
+    assert threaded.lnL == serial.lnL
+    assert np.all(threaded.hessian == serial.hessian)
+
+
+def _threaded_lnL(n_threads):
+    logm = np.linspace(11, 15, 1000)
+    return SampleLikeWeights(np.ones(1000), logm, 14.0, -1.8, 0.75, -20.0, chunksize=77, n_threads=n_threads).lnL
+
+
+def test_threaded_after_fork():
+    # A forked child cannot use the threads of its parent's pool, so must create its own.
+    import multiprocessing
+    serial = _threaded_lnL(1)
+    assert _threaded_lnL(3) == serial
+    pool = multiprocessing.Pool(1)
+    try:
+        assert pool.apply_async(_threaded_lnL, (3,)).get(60) == serial
+    finally:
+        pool.terminate()
+
+
+def test_memmap():
+    import tempfile
+    logm = np.linspace(11, 15, 1000)
+    w = np.arange(1000) % 5 + 1
+    d = tempfile.mkdtemp()
+    np.save(os.path.join(d, "logm.npy"), logm)
+    np.save(os.path.join(d, "w.npy"), w)
+
+    full = SampleLikeWeights(w, logm, 14.0, -1.8, 0.75, -20.0)
+    mapped = SampleLikeWeights(os.path.join(d, "w.npy"), os.path.join(d, "logm.npy"), 14.0, -1.8, 0.75, -20.0,
+                               chunksize=100)
+    assert isinstance(mapped.logm, np.memmap) and mapped.chunksize % 512 == 0
+    assert np.isclose(mapped.lnL, full.lnL, rtol=1e-12)
+    assert np.allclose(mapped.hessian, full.hessian, rtol=1e-12)
+
+    summary = SampleSummary(os.path.join(d, "logm.npy"), os.path.join(d, "w.npy"), chunksize=100)
+    assert np.allclose(summary.moments(14.0, 0.75), full._lng_sums, rtol=1e-12)
+
+
+def test_summary_append():
+    logm = np.linspace(11, 15, 400)
+    w = np.arange(400) % 7 + 1
+    full = SampleSummary(logm, w)
+
+    # Added masses include a new maximum mass, and masses below the truncation mass
+    streamed = SampleSummary(logm[::2], w[::2])
+    streamed.append(np.concatenate((logm[1::2], [10.0])), np.concatenate((w[1::2], [5])))
+    assert streamed.W == full.W
+    for h, a, b in [(14.0, -1.8, 0.75), (14.5, -1.85, 2.5)]:
+        assert np.allclose(streamed.moments(h, b), full.moments(h, b), rtol=1e-10)
+
+
+def test_summary_append_refines():
+    # A narrow initial sample needs few nodes, but appending a wide one must add more.
+    narrow, wide = np.linspace(11, 11.1, 50), np.linspace(11, 16, 400)
+    streamed = SampleSummary(narrow)
+    streamed.append(wide)
+    full = SampleSummary(np.concatenate((narrow, wide)))
+    assert len(streamed._nodes) == len(full._nodes)
+    for h, b in [(14.0, 0.75), (13.0, 1.7)]:
+        assert np.allclose(streamed.moments(h, b), full.moments(h, b), rtol=1e-12)
+
+
+def test_summary_unconverged():
+    import warnings
+    with warnings.catch_warnings(record=True) as w:
+        warnings.simplefilter("always")
+        SampleSummary(np.linspace(11, 16, 400), max_nodes=20)
+    assert any(issubclass(x.category, RuntimeWarning) for x in w)
+
+
+class TestErrors(object):
+    logm = np.linspace(12.0, 15.0, 40)
+    pars = dict(logHs=14.0, alpha=-1.85, beta=0.75, lnA=-25.0)
+
+    def test_small_sigma(self):
+        c = SampleLikeErrors(self.logm, 1e-3, log_mmin=11.9, **self.pars)
+        assert np.isclose(c.lnL, SampleLike(self.logm, log_mmin=11.9, **self.pars).lnL, rtol=1e-6)
+
+    def test_convolution(self):
+        from scipy.integrate import quad
+        sigma = np.linspace(0.1, 0.3, 40)
+        c = SampleLikeErrors(self.logm, sigma, log_mmin=11.9, **self.pars)
+        f = lambda x: dndm(10 ** x, self.pars['logHs'], self.pars['alpha'], self.pars['beta'], mmin=10 ** 11.9,
+                           norm=np.exp(self.pars['lnA'])) * 10 ** x * np.log(10)
+        for i in [0, 20]:
+            h = quad(lambda x: f(x) * np.exp(-(self.logm[i] - x) ** 2 / (2 * sigma[i] ** 2)), 11.9, 17)[0]
+            assert np.isclose(c._lnh[i], np.log(h / np.sqrt(2 * np.pi) / sigma[i]), atol=1e-3)
+
+    def test_jacobian(self):
+        sigma = np.linspace(0.1, 0.3, 40)
+        num = numerical_jac(lambda **kw: SampleLikeErrors(self.logm, sigma, log_mmin=11.9, **kw).lnL,
+                            ["logHs", "alpha", 'beta', "lnA"], 1e-6, **self.pars)
+        anl = SampleLikeErrors(self.logm, sigma, log_mmin=11.9, **self.pars).jacobian
+        assert np.allclose(anl, num, rtol=1e-4)
+
+
+class TestSelection(object):
+    logm = np.linspace(12.0, 15.0, 40)
+    pars = dict(logHs=14.0, alpha=-1.85, beta=0.75, lnA=-25.0)
+    selection = SelectionFunction([11.5, 12.5, 13.0, 13.5], [0.0, 0.4, 0.9, 1.0])
+
+    def test_complete(self):
+        # A constant selection function is equivalent to none at all.
+        c = SampleLike(self.logm, log_mmin=11.9, selection=SelectionFunction([11, 13], [1, 1]), **self.pars)
+        s = SampleLike(self.logm, log_mmin=11.9, **self.pars)
+        assert np.isclose(c.lnL, s.lnL, rtol=1e-12)
+        assert np.allclose(c.hessian, s.hessian, rtol=1e-10)
+
+    def test_expected_number(self):
+        from scipy.integrate import quad
+        c = SampleLike(self.logm, log_mmin=11.9, selection=self.selection, **self.pars)
+        f = lambda x: self.selection(x) * dndm(10 ** x, self.pars['logHs'], self.pars['alpha'], self.pars['beta'],
+                                               mmin=10 ** 11.9, norm=np.exp(self.pars['lnA'])) * 10 ** x * np.log(10)
+        assert np.isclose(c._Q, quad(f, 11.9, 13.5, points=[12.5, 13.0])[0] + quad(f, 13.5, 18)[0], rtol=1e-10)
+
+    def test_jacobian(self):
+        num = numerical_jac(lambda **kw: SampleLike(self.logm, log_mmin=11.9, selection=self.selection, **kw).lnL,
+                            ["logHs", "alpha", 'beta', "lnA"], 1e-6, **self.pars)
+        anl = SampleLike(self.logm, log_mmin=11.9, selection=self.selection, **self.pars).jacobian
+        assert np.allclose(anl, num, rtol=1e-4)
+
+    def test_hessian(self):
+        num = np.array([numerical_jac(lambda **kw: SampleLike(self.logm, log_mmin=11.9, selection=self.selection,
+                                                              **kw).jacobian[i],
+                                      ["logHs", "alpha", 'beta', "lnA"], 1e-6, **self.pars) for i in range(4)])
+        anl = SampleLike(self.logm, log_mmin=11.9, selection=self.selection, **self.pars).hessian
+        assert np.allclose(anl, num, rtol=1e-4, atol=1e-6)
+
+
+class TestBinned(object):
+    edges = np.linspace(12.0, 15.0, 16)
+    counts = np.round(1e4 * np.exp(-np.linspace(0, 6, 15)))
+    pars = dict(logHs=14.0, alpha=-1.85, beta=0.75, lnA=-25.0)
+
+    def test_expected_counts(self):
+        b = BinnedPoissonLike(self.edges, self.counts, **self.pars)
+        s = SampleLike(self.edges, log_mmin=12.0, **self.pars)
+        assert np.isclose(np.sum(b.expected_counts), s._q[0] - s._q[-1], rtol=1e-12)
+        assert np.allclose(b.expected_counts, [SampleLike(self.edges[i:i + 1], log_mmin=e, **self.pars)._q_ -
+                                               SampleLike(self.edges[i + 1:i + 2], log_mmin=self.edges[i + 1],
+                                                          **self.pars)._q_
+                                               for i, e in enumerate(self.edges[:-1])], rtol=1e-10)
+
+    def test_jacobian(self):
+        num = numerical_jac(lambda **kw: BinnedPoissonLike(self.edges, self.counts, **kw).lnL,
+                            ["logHs", "alpha", 'beta', "lnA"], 1e-6, **self.pars)
+        anl = BinnedPoissonLike(self.edges, self.counts, **self.pars).jacobian
+        assert np.allclose(anl, num, rtol=1e-4)
+
+    def test_hessian(self):
+        num = np.array([numerical_jac(lambda **kw: BinnedPoissonLike(self.edges, self.counts, **kw).jacobian[i],
+                                      ["logHs", "alpha", 'beta', "lnA"], 1e-6, **self.pars) for i in range(4)])
+        anl = BinnedPoissonLike(self.edges, self.counts, **self.pars).hessian
+        assert np.allclose(anl, num, rtol=1e-4)
+
+
+class TestProfile(object):
+    logm = np.linspace(12.0, 15.0, 40)
+    pars = dict(logHs=14.0, alpha=-1.85, beta=0.75, lnA=-30.0)
+
+    def test_lnA(self):
+        # At the profiled lnA, the expected number of masses equals the number of masses.
+        lnA, lnL = SampleLike(self.logm, log_mmin=11.9, **self.pars).profile_lnA()[:2]
+        s = SampleLike(self.logm, log_mmin=11.9, **dict(self.pars, lnA=lnA))
+        assert np.isclose(s._q_, len(self.logm), rtol=1e-12)
+        assert np.isclose(s.lnL, lnL, rtol=1e-12)
+
+    def test_jacobian(self):
+        keys = ["logHs", "alpha", 'beta']
+        num = numerical_jac(lambda **kw: SampleLike(self.logm, log_mmin=11.9, **kw).profile_lnA()[1],
+                            keys, 1e-6, **self.pars)
+        anl = SampleLike(self.logm, log_mmin=11.9, **self.pars).profile_lnA()[2]
+        assert np.allclose(anl, num, rtol=1e-4)
+
+    def test_hessian(self):
+        keys = ["logHs", "alpha", 'beta']
+        num = np.array([numerical_jac(lambda **kw: SampleLike(self.logm, log_mmin=11.9, **kw).profile_lnA()[2][i],
+                                      keys, 1e-6, **self.pars) for i in range(3)])
+        anl = SampleLike(self.logm, log_mmin=11.9, **self.pars).profile_lnA()[3]
+        assert np.allclose(anl, num, rtol=1e-4)
@@ -190,3 +190,33 @@ def test_hyperReg_2F2_vec_vec():
     ans = np.array([-0.0283642,  0.99684913])
     assert np.all(np.isclose(s.hyperReg_2F2(np.array([-0.8,0.8]),np.array([0.1,0.8])),ans))
 
+
+
+#===========================================================================
+# gammainc_fast()
+#===========================================================================
+def test_gammainc_fast_grid():
+    z = np.linspace(-3.5, 3, 14)
+    x = np.logspace(-6, 2, 9)
+    Z, X = np.meshgrid(z, x)
+    assert np.allclose(s.gammainc_fast(Z, X), s.gammainc(Z, X), rtol=1e-10, atol=0)
+
+def test_gammainc_fast_neg_int():
+    assert np.isclose(s.gammainc_fast(-2, 0.5), s.gammainc(-2, 0.5), rtol=1e-10)
+
+def test_gammainc_fast_near_neg_int():
+    z = np.array([-1 - 1e-10, -1e-12, -2 - 1e-6, -1 - 1e-4, -3 + 1e-7])
+    for x in [1e-3, 0.3, 0.9]:
+        assert np.allclose(s.gammainc_fast(z, x), s.gammainc(z, x), rtol=1e-10, atol=0)
+
+def test_gammainc_fast_float():
+    assert isinstance(s.gammainc_fast(-0.5, 0.1), float)
+
+
+#===========================================================================
+# G1(), G2() underflow
+#===========================================================================
+def test_G1_G2_underflow():
+    assert s.G1(0.5, 1e4) == 0
+    assert s.G2(-0.5, 1e4) == 0
+    assert s.G1(0.5, 50.0) > 0
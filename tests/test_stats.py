@@ -119,3 +119,19 @@ class TestTGGDln(object):
         tggd_log = TGGDlog(a=-1.5,b=0.7,xmin=10,scale=14)
         a = self.tggd.cdf(tggd_log.quantile(np.arange(0,1,0.1))*np.log(10))
         assert np.all(np.isclose(a,np.arange(0,1,0.1)))
+
+
+def test_rvs_low_discrepancy():
+    tggd = TGGD(a=-1.5, b=0.7, xmin=1e10, scale=1e14)
+    n = 2**10
+    expected = (np.arange(n) + 0.5)/n
+    for method in ["stratified", "sobol", "halton"]:
+        r = tggd.rvs(n, method=method, seed=42)
+        # Variates should fill the probability space nearly evenly
+        assert np.abs(np.sort(tggd.cdf(r)) - expected).max() < 2.0/n
+
+
+def test_rvs_reproducible():
+    tggd = TGGDlog(a=-1.5, b=0.7, xmin=10, scale=14)
+    for method in ["random", "stratified", "sobol", "halton"]:
+        assert np.all(tggd.rvs(100, method=method, seed=1) == tggd.rvs(100, method=method, seed=1))